@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+
+# 无界面批量抽帧：在多个进程中并行解码，输出单帧图片或缩略图拼图
+#   python extract.py a.mp4 b.mkv -n 16 --sheet --columns 4 -o out
+#   python extract.py a.mp4 --times 1.5 30 95 --width 0
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy
+
+from settings import DEFAULT_FPS
+from video.decoder import VideoDecoder
+from video.index import load_index
+from video.timestamps import format_time
+
+
+def probe(path):
+    video_capture = cv2.VideoCapture(path)
+    try:
+        if not video_capture.isOpened():
+            return None
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        return fps if fps > 0 else DEFAULT_FPS, int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        video_capture.release()
+
+
+def targets(total, fps, count, times=None):
+    # 指定时间点时按帧率换算帧号，否则取均分后每一段的中间帧
+    if times:
+        nums = [int(t * fps) for t in times]
+    else:
+        nums = [total * (2 * i + 1) // (2 * count) for i in range(count)]
+    return sorted(set(num for num in nums if 0 <= num < total))
+
+
+def split(nums, parts):
+    # 按顺序切成互不重叠的几段，每段由一个进程从前往后解码
+    size = -(-len(nums) // max(parts, 1))
+    return [nums[i:i + size] for i in range(0, len(nums), size)]
+
+
+def extract_segment(path, nums, width, quality):
+    # 在子进程中运行：独立的 VideoCapture，复用播放器的定位与解码逻辑
+    start = time.perf_counter()
+    decoder = VideoDecoder(cv2.VideoCapture(path), index=load_index(path))
+    frames = []
+    try:
+        for num in nums:
+            frame = decoder.read(num)
+            if frame is None:
+                break
+            if width:
+                height = max(1, frame.shape[0] * width // frame.shape[1])
+                output = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            else:
+                output = frame
+            success, data = cv2.imencode('.jpg', output, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            decoder.source_pool.release(frame)
+            if success:
+                frames.append((num, data.tobytes()))
+    finally:
+        decoder.video_capture.release()
+    return frames, time.perf_counter() - start
+
+
+def contact_sheet(frames, fps, columns):
+    images = [(num, cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_COLOR)) for num, data in frames]
+    height, width = images[0][1].shape[:2]
+    rows = -(-len(images) // columns)
+    sheet = numpy.zeros((rows * height, columns * width, 3), numpy.uint8)
+    for i, (num, image) in enumerate(images):
+        y, x = divmod(i, columns)
+        tile = sheet[y * height:(y + 1) * height, x * width:(x + 1) * width]
+        tile[:image.shape[0], :image.shape[1]] = image[:height, :width]
+        cv2.putText(tile, format_time(num / fps), (6, height - 8), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(0.4, width / 640), (255, 255, 255), 1, cv2.LINE_AA)
+    return sheet
+
+
+def save(path, frames, fps, output, sheet, columns, quality):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if sheet:
+        name = os.path.join(output, f'{stem}_sheet.jpg')
+        cv2.imwrite(name, contact_sheet(frames, fps, columns), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return [name]
+    names = []
+    for num, data in frames:
+        name = os.path.join(output, f'{stem}_{num:06d}.jpg')
+        with open(name, 'wb') as f:
+            f.write(data)
+        names.append(name)
+    return names
+
+
+def run(paths, count, times, output, sheet, columns, width, quality, jobs):
+    os.makedirs(output, exist_ok=True)
+    files = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = {}
+        for path in paths:
+            probed = probe(path)
+            if probed is None:
+                print(f'{path}: cannot open')
+                continue
+            fps, total = probed
+            nums = targets(total, fps, count, times)
+            if not nums:
+                print(f'{path}: no frames to extract')
+                continue
+            segments = split(nums, jobs)
+            files[path] = {'fps': fps, 'start': time.perf_counter(), 'left': len(segments), 'frames': [], 'decode': 0}
+            for segment in segments:
+                pending[pool.submit(extract_segment, path, segment, width, quality)] = path
+        for future in as_completed(pending):
+            path = pending[future]
+            item = files[path]
+            frames, seconds = future.result()
+            item['frames'].extend(frames)
+            item['decode'] += seconds
+            item['left'] -= 1
+            if item['left']:
+                continue
+            frames = sorted(item['frames'])
+            names = save(path, frames, item['fps'], output, sheet, columns, quality) if frames else []
+            # 墙钟时间包含排队等待，decode 为各进程解码耗时之和
+            print(f'{path}: {len(frames)} frames, {len(names)} files, '
+                  f'{time.perf_counter() - item["start"]:.2f}s wall, {item["decode"]:.2f}s decode')
+    print(f'total: {len(files)} files in {time.perf_counter() - start:.2f}s with {jobs} workers')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract frames or contact sheets without the GUI')
+    parser.add_argument('paths', nargs='+', help='video files')
+    parser.add_argument('-n', '--count', type=int, default=16, help='evenly spaced frames per file')
+    parser.add_argument('--times', nargs='+', type=float, help='timestamps in seconds instead of --count')
+    parser.add_argument('-o', '--output', default='.', help='output directory')
+    parser.add_argument('--sheet', action='store_true', help='write one contact sheet per file')
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--width', type=int, default=320, help='output width, 0 keeps the original size')
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    run(args.paths, args.count, args.times, args.output, args.sheet, args.columns, args.width, args.quality,
+        max(1, args.jobs))
@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*- 
 # !/usr/bin/env python3
+import bisect
+import os
 import sys
 
 from PyQt5 import QtCore, QtGui
-from PyQt5.QtCore import pyqtSignal, QPoint
+from PyQt5.QtCore import pyqtSignal, QDir, QPoint, QRect, QSize
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
-from sources import sources
 
+# 图标按需从 sources/images 读取，不再在导入时注册整个资源模块
+SOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sources')
+QDir.addSearchPath('icons', os.path.join(SOURCES, 'images'))
 
-class Player(QLabel):
+
+class Player(QWidget):
     double_clicked = pyqtSignal()
 
     def __init__(self, parent=None):
@@ -18,10 +23,112 @@ class Player(QLabel):
         self.mouse_pressed = False
         self.mouse_position = None
 
-        self.setPixmap(QPixmap(':welcome.png'))
-        self.setAlignment(QtCore.Qt.AlignCenter)
+        # pixmap 为欢迎图，原尺寸居中；image 为视频帧，按比例铺满 target
+        self.pixmap = None
+        self.image = None
+        self.frame = None
+        self.target = QRect()
+
+        # 性能统计与叠加显示的文字，由 MainWindow 设置
+        self.stats = None
+        self.hud = []
+
+        # 进度条上方的缩略图预览，x 为其中心的横坐标
+        self.preview = None
+        self.preview_frame = None
+        self.preview_x = 0
+
+        # 自己负责绘制全部区域，Qt 不需要预先擦除背景
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self.setPixmap(QPixmap('icons:welcome.png'))
         self.setMinimumSize(640, 360)
 
+    def setPixmap(self, pixmap: QPixmap):
+        self.pixmap = pixmap
+        self.image = None
+        self.frame = None
+        self.update_target()
+        self.update()
+
+    def set_image(self, image: QImage, frame=None):
+        # frame 为 image 引用的缓冲区，需要保持到下一帧替换为止
+        resized = self.image is None or self.image.size() != image.size()
+        self.pixmap = None
+        self.image = image
+        self.frame = frame
+        if resized:
+            self.update_target()
+            self.update()
+        else:
+            self.update(self.target)
+
+    def set_hud(self, lines):
+        self.hud = lines
+        self.update(self.target)
+
+    def set_preview(self, image: QImage = None, frame=None, x=0):
+        previous = self.preview_rect()
+        self.preview = image
+        self.preview_frame = frame
+        self.preview_x = x
+        self.update(previous.united(self.preview_rect()))
+
+    def preview_rect(self):
+        if self.preview is None:
+            return QRect()
+        size = self.preview.size()
+        left = min(max(self.preview_x - size.width() // 2, 0), max(self.width() - size.width(), 0))
+        return QRect(QPoint(left, self.height() - size.height() - 8), size)
+
+    def source_size(self):
+        if self.image is not None:
+            return self.image.size()
+        if self.pixmap is not None:
+            return self.pixmap.size()
+        return QSize()
+
+    def update_target(self):
+        # 每次尺寸变化时计算一次画面区域，而不是每帧计算
+        size = self.source_size()
+        if self.image is not None:
+            size.scale(self.size(), QtCore.Qt.KeepAspectRatio)
+        self.target = QRect(QPoint(0, 0), size)
+        self.target.moveCenter(self.rect().center())
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        self.update_target()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        start = self.stats.clock() if self.stats is not None else 0
+        painter = QPainter(self)
+        # 只有重绘区域超出画面时才补画黑边
+        letterbox = event.region().subtracted(QRegion(self.target))
+        for rect in letterbox.rects():
+            painter.fillRect(rect, self.palette().window())
+        if self.image is not None:
+            painter.drawImage(self.target, self.image)
+        elif self.pixmap is not None:
+            painter.drawPixmap(self.target, self.pixmap)
+        if self.hud:
+            self.paint_hud(painter)
+        if self.preview is not None:
+            rect = self.preview_rect()
+            painter.drawImage(rect, self.preview)
+            painter.setPen(QtCore.Qt.white)
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        if start:
+            self.stats.record('paint', start)
+
+    def paint_hud(self, painter: QPainter):
+        metrics = painter.fontMetrics()
+        width = max(metrics.horizontalAdvance(line) for line in self.hud) + 12
+        height = metrics.lineSpacing() * len(self.hud) + 8
+        box = QRect(self.target.topLeft() + QPoint(8, 8), QSize(width, height))
+        painter.fillRect(box, QColor(0, 0, 0, 160))
+        painter.setPen(QtCore.Qt.white)
+        for i, line in enumerate(self.hud):
+            painter.drawText(box.left() + 6, box.top() + 4 + metrics.ascent() + i * metrics.lineSpacing(), line)
+
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == QtCore.Qt.LeftButton:
             self.mouse_pressed = True
@@ -42,10 +149,50 @@ class Player(QLabel):
 
 class Slider(QSlider):
     signal_valueChanged = pyqtSignal(int)
+    signal_scrub = pyqtSignal(int)
+    # 指针所在位置的值与横坐标，离开时值为 -1
+    signal_hover = pyqtSignal(int, int)
 
     def __init__(self, parent=None):
         super(Slider, self).__init__()
 
+        self.dragging = False
+        self.dragged = False
+        # 镜头切换点，画成刻度，点击附近时对齐到切换点
+        self.marks = []
+        self.setMouseTracking(True)
+
+    def set_marks(self, marks):
+        self.marks = sorted(marks)
+        self.update()
+
+    def x_of(self, value):
+        span = max(self.maximum() - self.minimum(), 1)
+        return int((value - self.minimum()) * self.width() / span)
+
+    def value_at(self, x):
+        per = min(max(x * 1.0 / self.width(), 0), 1)
+        return int(per * (self.maximum() - self.minimum()) + self.minimum())
+
+    def snap_at(self, x, distance=4):
+        # 指针在切换点刻度附近时返回切换点，否则按位置换算
+        value = self.value_at(x)
+        i = bisect.bisect_left(self.marks, value)
+        nearby = [mark for mark in self.marks[max(i - 1, 0):i + 1] if abs(self.x_of(mark) - x) <= distance]
+        return min(nearby, key=lambda mark: abs(self.x_of(mark) - x)) if nearby else value
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        super(Slider, self).paintEvent(event)
+        if not self.marks:
+            return
+        painter = QPainter(self)
+        painter.setPen(QColor('#E06C75'))
+        height = self.height()
+        for mark in self.marks:
+            x = self.x_of(mark)
+            painter.drawLine(x, 0, x, height // 3)
+            painter.drawLine(x, height - height // 3, x, height)
+
     def wheelEvent(self, e: QtGui.QWheelEvent) -> None:
         pass
 
@@ -56,33 +203,88 @@ class Slider(QSlider):
         print(self.value())
 
     def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
-        current_x = event.pos().x()
-        per = current_x * 1.0 / self.width()
-        value = per * (self.maximum() - self.minimum()) + self.minimum()
-        self.signal_valueChanged.emit(value)
+        self.dragging = True
+        self.dragged = False
+        self.signal_valueChanged.emit(self.snap_at(event.pos().x()))
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent) -> None:
+        value = self.value_at(event.pos().x())
+        if self.dragging:
+            self.dragged = True
+            self.setValue(value)
+            self.signal_scrub.emit(value)
+        if self.isEnabled():
+            self.signal_hover.emit(value if self.dragging else self.snap_at(event.pos().x()), event.pos().x())
+
+    def leaveEvent(self, event: QtCore.QEvent) -> None:
+        self.signal_hover.emit(-1, 0)
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent) -> None:
+        if self.dragging and self.dragged:
+            self.signal_valueChanged.emit(self.value_at(event.pos().x()))
+        self.dragging = False
+
+
+class SpinBox(QSpinBox):
+    # text_of 把帧号转成显示的文字，value_of 把输入的文字转回帧号（无法解析时返回 None），为空时按整数显示
+    def __init__(self, parent=None):
+        super(SpinBox, self).__init__(parent)
+        self.text_of = None
+        self.value_of = None
+
+    def set_format(self, text_of=None, value_of=None):
+        self.text_of = text_of
+        self.value_of = value_of
+        self.lineEdit().setText(self.textFromValue(self.value()) + self.suffix())
+        self.updateGeometry()
+
+    def strip(self, text):
+        suffix = self.suffix()
+        return text[:-len(suffix)] if suffix and text.endswith(suffix) else text
+
+    def textFromValue(self, value: int) -> str:
+        if self.text_of is None:
+            return super(SpinBox, self).textFromValue(value)
+        return self.text_of(value)
+
+    def valueFromText(self, text: str) -> int:
+        if self.value_of is None:
+            return super(SpinBox, self).valueFromText(text)
+        value = self.value_of(self.strip(text))
+        return self.value() if value is None else value
+
+    def validate(self, text: str, pos: int):
+        if self.value_of is None:
+            return super(SpinBox, self).validate(text, pos)
+        cleaned = self.strip(text)
+        if self.value_of(cleaned) is not None:
+            return QValidator.Acceptable, text, pos
+        if all(c.isdigit() or c in ':. ' for c in cleaned):
+            return QValidator.Intermediate, text, pos
+        return QValidator.Invalid, text, pos
 
 
 class UI(QWidget):
     def __init__(self, parent=None):
         super(UI, self).__init__(parent, flags=QtCore.Qt.WindowStaysOnTopHint)
 
-        self.setWindowIcon(QIcon(':logo.png'))
+        self.setWindowIcon(QIcon('icons:logo.png'))
 
         self.setFocusPolicy(QtCore.Qt.NoFocus)
 
         self.player = Player(self)
 
         self.button_play = QPushButton('', self)
-        self.button_play.setIcon(QIcon(':play.svg'))
+        self.button_play.setIcon(QIcon('icons:play.svg'))
 
         self.button_reset = QPushButton('', self)
-        self.button_reset.setIcon(QIcon(':reset.svg'))
+        self.button_reset.setIcon(QIcon('icons:reset.svg'))
 
         self.button_open = QPushButton('', self)
-        self.button_open.setIcon(QIcon(':open.svg'))
+        self.button_open.setIcon(QIcon('icons:open.svg'))
         self.button_open.setObjectName('open')
 
-        self.widget_spin = QSpinBox(self)
+        self.widget_spin = SpinBox(self)
         self.widget_spin.setAlignment(QtCore.Qt.AlignRight)
 
         self.widget_slider = Slider(self)
@@ -108,7 +310,7 @@ class UI(QWidget):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     win = UI()
-    style_sheet = open(r'../sources/style.qss', mode='r', encoding='utf-8').read()
+    style_sheet = open(os.path.join(SOURCES, 'style.qss'), mode='r', encoding='utf-8').read()
     win.setStyleSheet(style_sheet)
     win.show()
     sys.exit(app.exec_())
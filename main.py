@@ -1,49 +1,84 @@
 # -*- coding: utf-8 -*- 
 # !/usr/bin/env python3
+import argparse
+import logging
+import os
 import sys
 import time
 
-import cv2
 from PyQt5 import QtCore, QtGui
-from PyQt5.QtCore import QMutexLocker, QMutex, QThread, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QIcon
-from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+from PyQt5.QtCore import QPoint, QSize, QThread, QTimer
+from PyQt5.QtGui import QPixmap, QIcon
+from PyQt5.QtWidgets import QApplication, QFileDialog, QInputDialog, QMessageBox, QToolTip
 
 from interface.UI import UI
-from settings import APP_NAME
+from settings import (ADAPTIVE_INTERVAL_MS, ADAPTIVE_QUALITY, APP_NAME, AUDIO_SINK, DEFAULT_FPS, HUD_INTERVAL_MS,
+                      PLAYBACK_SPEEDS, RESIZE_SETTLE_MS, SCENE_BACK_SECONDS, SCENE_SAVE_SECONDS, SCRUB_SETTLE_MS)
+from video.adaptive import AdaptiveQuality
+from video.cache import VideoCache
+from video.clock import VideoTimer
+from video.stats import PlaybackStats
+from video.timestamps import TimestampIndex, format_time, parse_time
 
+# cv2 与 numpy 导入很慢，依赖它们的模块在第一次打开视频时才导入，欢迎界面不必等待
 
-class VideoTimer(QThread):
-    signal_update_frame = pyqtSignal()
-    signal_finished = pyqtSignal()
-
-    def __init__(self):
-        super(VideoTimer, self).__init__()
-        self.playing = False
-        self.fps = 0
-        self.mutex = QMutex()
-
-    def run(self):
-        with QMutexLocker(self.mutex):
-            self.playing = True
-        while self.playing:
-            self.signal_update_frame.emit()
-            time.sleep(1 / self.fps)
-        self.signal_finished.emit()
-
-    def pause(self):
-        with QMutexLocker(self.mutex):
-            self.playing = False
+logger = logging.getLogger(__name__)
 
 
 class MainWindow(UI):
     VIDEO_TYPE_OFFLINE = 0
     VIDEO_TYPE_REAL_TIME = 1
 
-    def __init__(self):
+    def __init__(self, audio_sink=AUDIO_SINK, publish=None, filters=()):
         super(MainWindow, self).__init__()
 
-        self.timer = VideoTimer()
+        self.stats = PlaybackStats()
+        self.timer = VideoTimer(self.stats)
+        self.decoder = None
+        # 声音线程与输出方式，见 video.audio.create_sink
+        self.audio = None
+        self.audio_sink = audio_sink
+        # 把显示的每一帧发布到共享内存，供本机的分析进程读取，见 video.shared
+        self.publisher = None
+        if publish:
+            from video.shared import FramePublisher
+            self.publisher = FramePublisher(publish)
+        # 逐帧滤镜的命令行写法，每次打开视频时重新创建，见 video.filters.parse_filter
+        self.filters = list(filters)
+        self.indexer = None
+        self.cache = None
+        self.thumbnails = None
+        self.thumbnailer = None
+        # 镜头切换点与后台检测线程
+        self.scenes = None
+        self.scene_detector = None
+        self.scenes_saved = 0
+        # 拖动时使用的低分辨率代理文件，proxy_progress 为生成进度
+        self.proxy = None
+        self.proxy_builder = None
+        self.proxy_progress = None
+
+        self.scrub_timer = QTimer(self)
+        self.scrub_timer.setSingleShot(True)
+        self.scrub_timer.setInterval(SCRUB_SETTLE_MS)
+
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_SETTLE_MS)
+
+        self.hud_timer = QTimer(self)
+        self.hud_timer.setInterval(HUD_INTERVAL_MS)
+        self.player.stats = self.stats
+
+        # 自适应画质：定期比较丢帧与解码线程负载，逐级降低或恢复
+        self.quality = AdaptiveQuality()
+        self.adaptive = ADAPTIVE_QUALITY
+        self.adaptive_sample = None
+        self.adaptive_timer = QTimer(self)
+        self.adaptive_timer.setInterval(ADAPTIVE_INTERVAL_MS)
+
+        # 进度显示为时间还是帧号
+        self.show_time = False
 
         self.action_reset()
 
@@ -57,108 +92,716 @@ class MainWindow(UI):
         self.timer.signal_finished.connect(self.video_pause)
 
         self.widget_slider.signal_valueChanged.connect(self.video_jump)
+        self.widget_slider.signal_scrub.connect(self.video_scrub)
+        self.widget_slider.signal_hover.connect(self.video_hover)
+        self.scrub_timer.timeout.connect(self.video_settle)
+        self.resize_timer.timeout.connect(self.video_resized)
+        self.hud_timer.timeout.connect(self.update_hud)
+        self.adaptive_timer.timeout.connect(self.video_adapt)
 
     def action_reset(self):
+        self.save_position()
         self.setWindowTitle(APP_NAME)
 
-        self.player.setPixmap(QPixmap(':welcome.png'))
+        self.player.setPixmap(QPixmap('icons:welcome.png'))
 
         self.video_url = ''
+        self.video_type = self.VIDEO_TYPE_OFFLINE
         self.video_fps = 0
         self.video_total_frames = 0
         self.video_height = 0
         self.video_width = 0
         self.num = 0
-
-        self.current_frame = None
+        # 时钟推进到的帧号，快进时界面只显示其中一部分
+        self.playhead = 0
+        # 时钟走到的显示时间（毫秒），由时间戳索引换算成 playhead
+        self.media_time = 0
+        self.timestamps = TimestampIndex()
+        self.speed = 1
+        self.direction = 1
+        # A/B 循环的两个端点，只设置了 A 点时 B 为 None
+        self.loop = None
+
+        self.current_array = None
 
         self.widget_slider.setValue(0)
+        self.widget_slider.setEnabled(True)
+        self.widget_spin.setEnabled(True)
         self.widget_spin.setHidden(True)
 
         # timer 设置
         self.timer.pause()
+        self.timer.set_speed(self.speed)
 
         # video 初始设置
-        self.video_capture = cv2.VideoCapture()
+        if self.decoder is not None:
+            logger.info('playback stats: %s', self.stats)
+        self.stop_workers()
+        self.cache = None
+        self.thumbnails = None
+        self.scenes = None
+        self.widget_slider.set_marks([])
+        self.proxy_progress = None
+        self.adaptive_timer.stop()
+        self.adaptive_sample = None
+        self.quality.reset()
+        self.player.set_preview()
+        self.stats.reset()
+        self.video_capture = None
+
+    def stop_workers(self):
+        if self.indexer is not None:
+            self.indexer.stop()
+            self.indexer = None
+        if self.thumbnailer is not None:
+            self.thumbnailer.stop()
+            self.thumbnailer = None
+        if self.scene_detector is not None:
+            self.scene_detector.stop()
+            self.scene_detector = None
+            # 没扫描完的部分下次打开时继续
+            self.save_scenes()
+        if self.proxy_builder is not None:
+            self.proxy_builder.stop()
+            self.proxy_builder = None
+        if self.proxy is not None:
+            self.proxy.stop()
+            self.proxy = None
+        if self.audio is not None:
+            self.audio.stop()
+            self.audio = None
+        if self.decoder is not None:
+            self.decoder.stop()
+            self.decoder = None
+
+    def set_playhead(self, num):
+        self.num = self.playhead = num
+        self.media_time = self.timestamps.time_of(num)
 
     def video_jump(self, num):
-        self.num = num
+        self.scrub_timer.stop()
+        self.set_playhead(num)
         self.widget_slider.setValue(num)
         self.widget_spin.setValue(num)
-        self.get_frame(num)
+        if self.decoder is not None:
+            self.decoder.seek(num)
+        if self.audio is not None and not self.audio.paused:
+            self.audio.seek(self.media_time)
+
+    def video_scrub(self, num):
+        self.set_playhead(num)
+        self.widget_spin.setValue(num)
+        if self.decoder is not None:
+            requested = time.perf_counter()
+            # 先显示缓存中最接近的帧，精确帧等指针停下后再解码
+            cached = self.decoder.nearest(num)
+            if cached is not None:
+                # 播放位置仍是拖动的目标，显示、统计与发布的帧号用缓存帧自己的帧号
+                self.show_frame(cached[1], cached[0])
+                self.stats.sample('seek_latency', time.perf_counter() - requested)
+            if self.proxy is not None:
+                # 有代理文件时拖动中从代理取帧，原视频只在松手后解码最终帧
+                self.proxy.seek(num, requested)
+            else:
+                self.decoder.seek(num, exact=False)
+            self.scrub_timer.start()
+
+    def video_settle(self):
+        if self.decoder is not None:
+            self.decoder.seek(self.widget_slider.value())
+
+    def video_resized(self):
+        if self.decoder is not None:
+            self.decoder.set_output_size(*self.output_size())
+            self.video_quality(not self.timer.playing)
+
+    def video_quality(self, smooth):
+        # 暂停时按高质量插值重新输出当前帧
+        self.decoder.set_quality(smooth)
+        if smooth:
+            self.decoder.seek(self.num)
 
     def video_pause(self):
-        if self.num >= self.video_total_frames:
+        if self.video_type == self.VIDEO_TYPE_OFFLINE and self.num >= self.video_total_frames:
             self.action_reset()
 
-    def video_play(self):
-        if self.num is None:
-            self.num = self.video_capture.get(cv2.CAP_PROP_POS_FRAMES) + 1
+    def video_play(self, skip=0):
+        if self.decoder is None or self.widget_slider.dragging:
+            self.timer.frame_shown()
+            return
+        audio = None
+        if self.current_array is None:
+            item = self.decoder.get()
+        else:
+            # 时钟按显示时间推进，取该时刻应显示的那一帧，中间来不及显示的帧由解码线程跳过
+            audio = self.audio.clock() if self.audio is not None else None
+            if audio is not None:
+                # 有声音时以声音为主时钟：视频落后就跳帧，超前就继续显示当前帧
+                self.media_time = audio
+            else:
+                fps = self.timer.fps if self.timer.fps > 0 else DEFAULT_FPS
+                self.media_time += (1 + skip) * self.direction * 1000 / fps
+            self.playhead = self.timestamps.frame_at(self.media_time)
+            item = self.decoder.get(self.playhead)
+        if item is not None:
+            # 循环时 playhead 一直增加，显示的帧号折回到 A..B 之间
+            num, frame = item
+            self.num = self.decoder.fold(num)
+            self.widget_slider.setValue(self.num)
+            self.widget_spin.setValue(self.num)
+            self.show_frame(frame)
+            if self.video_type == self.VIDEO_TYPE_REAL_TIME:
+                self.stats.sample('latency', time.perf_counter() - self.decoder.captured)
+            if audio is not None:
+                # 画面与声音时钟的偏差（绝对值）：只反映视频跟随时钟的误差，时钟本身与实际出声之间的延迟不在其中
+                self.stats.sample('av_offset', abs(self.timestamps.time_of(self.num) - audio) / 1000, self.num)
+        elif self.decoder.eof and not len(self.decoder.queue):
+            if self.video_type == self.VIDEO_TYPE_OFFLINE and self.direction > 0:
+                self.num = self.video_total_frames
+            self.timer.pause()
+            self.sync_audio()
+            self.button_play.setIcon(QIcon('icons:play.svg'))
+        self.timer.frame_shown()
+
+    def video_audio(self, available):
+        if available:
+            self.sync_audio()
+        elif self.audio is not None:
+            # 没有音轨，线程已经退出，只用视频时钟
+            self.audio.wait()
+            self.audio = None
+
+    def sync_audio(self):
+        # 只在正常速度正向播放且没有 A/B 循环时出声并作为主时钟，其它情况暂停声音，由视频时钟推进
+        if self.audio is None:
+            return
+        looping = self.loop is not None and self.loop[1] is not None
+        if self.timer.playing and self.speed == 1 and self.direction > 0 and not looping:
+            if self.audio.paused:
+                self.audio.seek(self.media_time)
+                self.audio.resume()
+        else:
+            self.audio.pause()
+
+    def video_indexed(self, count):
+        index = self.decoder.index if self.decoder is not None else None
+        variable = self.timestamps.variable and self.timestamps.complete
+        if self.cache and index is not None and index.complete:
+            # 恒定帧率的视频按帧率换算即可，不保存每一帧的时间；可变帧率视频每一帧的时间可能有几 MB，
+            # 单独存到 timestamps.json，info.json 保持很小，保存播放位置时不必重写这些数据
+            self.cache.save_json('timestamps.json', self.timestamps.times if self.timestamps.variable else [])
+            values = {'keyframes': index.keyframes, 'scanned': index.scanned}
+            if variable:
+                values['meta'] = dict(self.cache.get('meta') or {}, frames=len(self.timestamps))
+            # 旧版本把时间戳存在 info.json 中，一并清掉
+            self.cache.set(timestamps=None, **values)
+            logger.info('keyframe index cached: %d keyframes', count)
+        if variable:
+            self.video_timestamps()
+        # 直接使用索引中的关键帧，不必再扫描一遍文件；上一个视频的索引线程发来的信号不算
+        thumbnailer = self.thumbnailer
+        indexing = self.indexer is not None and self.indexer.isRunning()
+        if thumbnailer is not None and not (thumbnailer.isRunning() or thumbnailer.isFinished() or indexing):
+            thumbnailer.start(QThread.LowPriority)
+
+    def video_timestamps(self):
+        # 可变帧率：总帧数以扫描到的帧为准，时钟按较短的帧间隔刷新
+        self.video_total_frames = len(self.timestamps)
+        self.timer.fps = self.timestamps.frame_rate()
+        self.widget_slider.setMaximum(self.video_total_frames)
+        self.widget_spin.setMaximum(self.video_total_frames)
+        self.update_position_format()
+        logger.info('variable frame rate: %d frames, clock %.1f fps', self.video_total_frames, self.timer.fps)
+
+    def update_position_format(self):
+        # 进度显示为时间或帧号，T 键切换
+        if self.show_time:
+            self.widget_spin.set_format(self.format_position, self.parse_position)
+            self.widget_spin.setSuffix(f'/{format_time(self.timestamps.time_of(self.video_total_frames) / 1000)}')
+        else:
+            self.widget_spin.set_format()
+            self.widget_spin.setSuffix(f'/{int(self.video_total_frames)}')
+
+    def format_position(self, num):
+        return format_time(self.timestamps.time_of(num) / 1000)
+
+    def parse_position(self, text):
+        seconds = parse_time(text)
+        return None if seconds is None else self.timestamps.frame_at(seconds * 1000)
+
+    def action_time(self):
+        self.show_time = not self.show_time
+        if self.video_type == self.VIDEO_TYPE_OFFLINE and self.video_url:
+            self.update_position_format()
+
+    def video_proxied(self, num, frame, requested):
+        # 松手后原视频的精确帧已经在路上，晚到的代理帧直接丢弃
+        if self.widget_slider.dragging:
+            self.video_seeked(num, frame, requested)
+
+    def action_proxy(self):
+        # 后台生成低分辨率代理文件，生成过的视频下次打开直接使用
+        if self.video_type != self.VIDEO_TYPE_OFFLINE or not self.cache or self.proxy or self.proxy_builder:
+            return
+        from video.proxy import ProxyBuilder
+        self.proxy_builder = ProxyBuilder(self.video_url, self.cache.path('proxy.avi'), self.video_total_frames)
+        self.proxy_builder.signal_progress.connect(self.video_proxy_progress)
+        self.proxy_builder.signal_finished.connect(self.video_proxy_ready)
+        self.proxy_builder.start(QThread.LowPriority)
+
+    def video_proxy_progress(self, percent):
+        self.proxy_progress = percent
+        self.update_title()
+
+    def video_proxy_ready(self, path):
+        self.proxy_builder = None
+        self.proxy_progress = None
+        if self.cache:
+            self.cache.set(proxy=True)
+        self.use_proxy(path)
+        self.update_title()
+        logger.info('proxy ready: %s', path)
+
+    def use_proxy(self, path):
+        from video.proxy import ProxyReader
+        self.proxy = ProxyReader(path)
+        self.proxy.signal_frame.connect(self.video_proxied)
+        self.proxy.start()
+
+    def video_thumbnailed(self, count):
+        if self.cache:
+            self.cache.set(thumbnails=count)
+
+    def video_scenes(self, scanned):
+        if self.scenes is not None:
+            self.widget_slider.set_marks(self.scenes.snapshot()[0])
+            # 扫描中只是节流保存，中断后最多重新扫描 SCENE_SAVE_SECONDS 秒的进度
+            if time.monotonic() - self.scenes_saved >= SCENE_SAVE_SECONDS:
+                self.save_scenes()
+
+    def video_scenes_finished(self, count):
+        self.video_scenes(count)
+        self.save_scenes()
+        logger.info('scene index cached: %d cuts', count)
+
+    def save_scenes(self):
+        # 单独存为 scenes.json，不重写 info.json（可变帧率视频的 info.json 含有每一帧的时间，可能有几 MB）
+        if self.cache and self.scenes is not None:
+            cuts, scanned, complete = self.scenes.snapshot()
+            self.cache.save_json('scenes.json', {'cuts': cuts, 'scanned': scanned, 'complete': complete})
+            self.scenes_saved = time.monotonic()
+
+    def action_scene(self, direction):
+        # 跳到下一个镜头的开头；往回跳时离当前镜头开头不到 SCENE_BACK_SECONDS 秒就跳到上一个镜头，与章节跳转一致
+        if self.scenes is None or self.decoder is None or self.video_type == self.VIDEO_TYPE_REAL_TIME:
+            return
+        if direction > 0:
+            num = self.scenes.next(self.num)
+        else:
+            fps = self.video_fps if self.video_fps > 0 else DEFAULT_FPS
+            num = self.scenes.previous(self.num - int(SCENE_BACK_SECONDS * fps) + 1) or 0
+        if num is not None:
+            self.video_jump(num)
+
+    def video_hover(self, num, x):
+        if num < 0 or self.video_type != self.VIDEO_TYPE_OFFLINE or not self.video_url:
+            QToolTip.hideText()
+        else:
+            # 指针所在位置的时间或帧号，与数字框的显示方式一致
+            QToolTip.showText(self.widget_slider.mapToGlobal(QPoint(x, 0)), self.widget_spin.textFromValue(num),
+                              self.widget_slider)
+        thumbnail = self.thumbnails.get(num) if self.thumbnails is not None and num >= 0 else None
+        if thumbnail is None:
+            self.player.set_preview()
+            return
+        from video.frames import to_qimage
+        frame = thumbnail[1]
+        x = self.player.mapFromGlobal(self.widget_slider.mapToGlobal(QPoint(x, 0))).x()
+        self.player.set_preview(to_qimage(frame), frame, x)
+
+    def save_position(self):
+        if self.cache and self.decoder is not None:
+            self.cache.set(position=self.num)
+
+    def video_seeked(self, num, frame, requested):
+        self.set_playhead(num)
+        self.show_frame(frame)
+        self.stats.sample('seek_latency', time.perf_counter() - requested)
+
+    def set_speed(self, speed):
+        if self.video_type == self.VIDEO_TYPE_REAL_TIME:
+            return
+        self.speed = speed
+        self.timer.set_speed(speed)
+        if self.decoder is not None:
+            self.decoder.set_speed(speed)
+        self.sync_audio()
+        self.update_title()
+        logger.info('playback speed: %sx', speed)
+
+    def set_direction(self, direction):
+        if self.video_type == self.VIDEO_TYPE_REAL_TIME or self.decoder is None:
+            return
+        self.direction = direction
+        self.decoder.set_direction(direction)
+        # 队列中是原方向预解码的帧，从当前帧重新开始
+        self.decoder.seek(self.num)
+        self.sync_audio()
+        self.update_title()
+
+    def action_reverse(self):
+        self.set_direction(-self.direction)
+        if not self.timer.playing:
+            self.action_play()
+
+    def action_loop(self):
+        # 第一次按下设置 A 点，第二次设置 B 点并从 A 点开始循环，第三次取消
+        if self.decoder is None or self.video_type == self.VIDEO_TYPE_REAL_TIME:
+            return
+        if self.loop is None:
+            self.loop = (self.num, None)
+        elif self.loop[1] is None:
+            a, b = sorted((self.loop[0], self.num))
+            self.loop = (a, b)
+            self.decoder.set_loop(a, b)
+            self.video_jump(a)
+            logger.info('loop %d-%d', a, b)
         else:
-            self.num += 1
-        self.widget_slider.setValue(self.num)
-        self.widget_spin.setValue(self.num)
-        self.get_frame()
+            self.loop = None
+            self.decoder.set_loop()
+            # playhead 换回视频中的帧号，解码线程从当前帧重新开始
+            self.video_jump(self.num)
+        self.sync_audio()
+        self.update_title()
+
+    def action_step(self, step):
+        # 暂停后逐帧前进或后退，后退的帧来自解码线程缓存的整段 GOP
+        if self.decoder is None or self.video_type == self.VIDEO_TYPE_REAL_TIME:
+            return
+        if self.timer.playing:
+            self.action_play()
+        num = min(max(self.num + step, 0), max(self.video_total_frames - 1, 0))
+        if num != self.num:
+            self.video_jump(num)
+
+    def video_adapt(self):
+        if self.decoder is None:
+            return
+        sample = (time.perf_counter(), self.stats.snapshot(), self.decoder.busy)
+        previous, self.adaptive_sample = self.adaptive_sample, sample
+        if previous is None or not self.timer.playing or not self.adaptive:
+            return
+        delta = {name: sample[1][name] - previous[1][name] for name in ('dropped', 'underruns', 'seeks')}
+        if delta['seeks']:
+            # 跳转后队列暂时为空，不算作性能不足
+            return
+        elapsed = sample[0] - previous[0]
+        fps = self.timer.fps if self.timer.fps > 0 else DEFAULT_FPS
+        level = self.quality.update(delta['dropped'] + delta['underruns'], elapsed * fps * min(self.speed, 1),
+                                    (sample[2] - previous[2]) / elapsed)
+        if level is not None:
+            self.set_quality_level(level)
+
+    def set_quality_level(self, level):
+        self.quality.level = level
+        self.decoder.set_degrade(level)
+        self.update_title()
+        logger.info('quality level %d: %s', level, self.quality)
+
+    def action_adaptive(self):
+        self.adaptive = not self.adaptive
+        logger.info('adaptive quality %s', 'on' if self.adaptive else 'off')
+        if not self.adaptive and self.decoder is not None:
+            self.quality.reset()
+            self.set_quality_level(0)
+
+    def change_speed(self, step):
+        # 在 PLAYBACK_SPEEDS 中切换到相邻的档位
+        speeds = list(PLAYBACK_SPEEDS)
+        i = speeds.index(self.speed) if self.speed in speeds else speeds.index(1)
+        self.set_speed(speeds[min(max(i + step, 0), len(speeds) - 1)])
+
+    def update_title(self):
+        title = f'{APP_NAME} - {self.video_url}'
+        if self.video_type == self.VIDEO_TYPE_REAL_TIME:
+            title += ' (live)'
+        elif self.speed != 1 or self.direction < 0:
+            title += f' ({self.speed * self.direction}x)'
+        if self.proxy_progress is not None:
+            title += f' [proxy {self.proxy_progress}%]'
+        if self.quality.level:
+            title += f' [{self.quality}]'
+        if self.loop is not None:
+            title += f' [A {self.loop[0]}]' if self.loop[1] is None else f' [loop {self.loop[0]}-{self.loop[1]}]'
+        self.setWindowTitle(title)
 
     def action_double_clicked(self):
-        [self.action_open, self.action_play][self.video_capture.isOpened()]()
+        [self.action_open, self.action_play][self.opened()]()
+
+    def opened(self):
+        return self.video_capture is not None and self.video_capture.isOpened()
 
     def action_open(self):
         video_url, _ = QFileDialog.getOpenFileName(self, 'Video Player', '', '*.mp4;*.mkv;*.rmvb')
         if video_url:
-            self.action_reset()
+            self.open_video(video_url)
 
-            self.video_url = video_url
-            self.video_capture.open(filename=self.video_url)
-            self.setWindowTitle(f'{APP_NAME} - {self.video_url}')
-            self.video_fps = self.video_capture.get(cv2.CAP_PROP_FPS)
-            self.video_total_frames = self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT)
-            self.video_height = self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
-            self.video_width = self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
-            self.num = 0
-            self.timer.fps = self.video_fps
-            self.widget_slider.setMaximum(self.video_total_frames)
-            self.widget_spin.setSuffix(f'/{int(self.video_total_frames)}')
-            self.widget_spin.setMaximum(self.video_total_frames)
-            self.widget_spin.setHidden(False)
+    def action_open_live(self):
+        source, ok = QInputDialog.getText(self, APP_NAME, 'Camera index, URL or pipe:')
+        if ok and source:
+            self.open_live(source)
 
-            self.action_play()
+    def open_video(self, video_url):
+        import cv2
+        from video.audio import AudioPlayer, create_sink
+        from video.decoder import VideoDecoder
+        from video.index import KeyframeIndex, KeyframeIndexer
+        from video.scenes import SceneDetector, SceneIndex
+        from video.thumbnails import ThumbnailWorker, Thumbnails
+
+        self.action_reset()
+
+        self.video_url = video_url
+        self.cache = VideoCache(self.video_url)
+        self.video_capture = cv2.VideoCapture(self.video_url)
+        self.update_title()
+        # 打开过的文件直接使用缓存的元数据
+        meta = self.cache.get('meta')
+        if meta is None:
+            meta = {
+                'fps': self.video_capture.get(cv2.CAP_PROP_FPS),
+                'frames': int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+                'height': self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                'width': self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH),
+            }
+            self.cache.set(meta=meta)
+        self.video_fps = meta['fps']
+        self.video_total_frames = meta['frames']
+        self.video_height = meta['height']
+        self.video_width = meta['width']
+        self.num = 0
+        index = KeyframeIndex()
+        self.timestamps = TimestampIndex(self.video_fps)
+        keyframes = self.cache.get('keyframes')
+        timestamps = self.cache.load_json('timestamps.json')
+        if keyframes and timestamps is not None:
+            index.restore(keyframes, self.cache.get('scanned', 0))
+            self.timestamps.restore(timestamps)
+        else:
+            # 后台建立关键帧与时间戳索引，建好之前跳转退回到 CAP_PROP_POS_FRAMES，时间按帧率换算
+            self.indexer = KeyframeIndexer(self.video_url, index, self.timestamps)
+            self.indexer.signal_finished.connect(self.video_indexed)
+            self.indexer.start(QThread.LowPriority)
+        # 缩略图建好后存到磁盘，再次打开时直接读取
+        self.thumbnails = Thumbnails(self.cache.path('thumbnails') if self.cache else None)
+        if not (self.cache.get('thumbnails') and self.thumbnails.load()):
+            self.thumbnailer = ThumbnailWorker(self.video_url, self.thumbnails, index, self.video_total_frames)
+            self.thumbnailer.signal_finished.connect(self.video_thumbnailed)
+            if self.indexer is None:
+                self.thumbnailer.start(QThread.LowPriority)
+            # 否则等关键帧索引建好后再开始，见 video_indexed
+        # 镜头切换点：缓存中没有或上次没扫描完时，在后台以最低优先级继续检测
+        self.scenes = SceneIndex()
+        scenes = self.cache.load_json('scenes.json')
+        if scenes:
+            self.scenes.restore(scenes['cuts'], scenes['scanned'], scenes['complete'])
+            self.widget_slider.set_marks(self.scenes.snapshot()[0])
+        if not self.scenes.complete:
+            self.scene_detector = SceneDetector(self.video_url, self.scenes)
+            self.scene_detector.signal_progress.connect(self.video_scenes)
+            self.scene_detector.signal_finished.connect(self.video_scenes_finished)
+            self.scene_detector.start(QThread.LowestPriority)
+        if self.cache.get('proxy') and os.path.exists(self.cache.path('proxy.avi')):
+            self.use_proxy(self.cache.path('proxy.avi'))
+        self.cache.touch()
+        self.cache.evict()
+        self.decoder = VideoDecoder(self.video_capture, self.stats, index, self.timestamps)
+        self.decoder.signal_frame.connect(self.video_seeked)
+        self.decoder.set_output_size(*self.output_size())
+        self.timer.fps = self.timestamps.frame_rate() if self.timestamps.variable else self.video_fps
+        self.create_filters()
+        self.widget_slider.setMaximum(self.video_total_frames)
+        self.widget_spin.setMaximum(self.video_total_frames)
+        self.update_position_format()
+        self.widget_spin.setHidden(False)
+        self.adaptive_timer.start()
+        # 声音在自己的线程中解码与输出，找到音轨后作为主时钟
+        self.audio = AudioPlayer(self.video_url, create_sink(self.audio_sink))
+        self.audio.signal_opened.connect(self.video_audio)
+        self.audio.start()
+        # 从上次停下的位置继续播放
+        position = self.cache.get('position', 0)
+        if 0 < position < self.video_total_frames:
+            self.video_jump(position)
+        self.decoder.start()
+
+        self.action_play()
+
+    def open_live(self, source):
+        import cv2
+        from video.live import LiveDecoder, open_live_capture
+
+        self.action_reset()
+
+        self.video_capture = open_live_capture(source)
+        if not self.video_capture.isOpened():
+            QMessageBox.warning(self, APP_NAME, f'Cannot open {source}')
+            return
+        self.video_url = str(source)
+        self.video_type = self.VIDEO_TYPE_REAL_TIME
+        self.update_title()
+        self.video_fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+        self.video_height = self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        self.video_width = self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+        self.num = 0
+        # 直播源没有总帧数，不能跳转
+        self.decoder = LiveDecoder(self.video_capture, self.stats, pace=os.path.isfile(self.video_url))
+        self.decoder.set_output_size(*self.output_size())
+        self.timer.fps = self.video_fps
+        self.create_filters()
+        self.decoder.start()
+        self.widget_slider.setEnabled(False)
+        self.widget_spin.setEnabled(False)
+        self.widget_spin.setSuffix('')
+        self.widget_spin.setMaximum(2 ** 31 - 1)
+        self.widget_spin.setHidden(False)
+
+        self.action_play()
+
+    def open_source(self, source, live=False):
+        from video.live import is_live_source
+        if live or is_live_source(source):
+            self.open_live(source)
+        else:
+            self.open_video(source)
+
+    def create_filters(self):
+        if not self.filters:
+            return
+        from video.filters import parse_filter
+        self.decoder.set_filters([parse_filter(spec) for spec in self.filters])
+        # 每帧的时间预算为一个帧间隔
+        self.decoder.filters.set_budget(1 / (self.timer.fps if self.timer.fps > 0 else DEFAULT_FPS))
+
+    def action_filters(self):
+        # 开关全部滤镜，暂停时重新解码当前帧
+        if self.decoder is None or self.decoder.filters is None:
+            return
+        self.decoder.filters.enabled = not self.decoder.filters.enabled
+        logger.info('filters %s', 'on' if self.decoder.filters.enabled else 'off')
+        if self.video_type != self.VIDEO_TYPE_REAL_TIME:
+            self.decoder.seek(self.num)
 
     def action_play(self):
-        if self.video_capture.isOpened():
-            self.button_play.setIcon(QIcon([':pause.svg', ':play.svg'][self.timer.playing]))
-            [self.timer.start, self.timer.pause][self.timer.playing]()
+        if self.opened():
+            playing = self.timer.playing
+            self.button_play.setIcon(QIcon(['icons:pause.svg', 'icons:play.svg'][playing]))
+            [self.timer.start, self.timer.pause][playing]()
+            self.sync_audio()
+            self.video_quality(playing)
         elif self.video_url:
             self.video_play()
 
-    def get_appropriate_size(self):
-        if (self.player.width() / self.player.height()) > (self.video_width / self.video_height):
-            return self.player.height() * (self.video_width / self.video_height), self.player.height()
+    def output_size(self):
+        size = QSize(int(self.video_width), int(self.video_height))
+        size.scale(self.player.size(), QtCore.Qt.KeepAspectRatio)
+        return size.width(), size.height()
+
+    def show_frame(self, frame, num=None):
+        # 直接以 BGR 格式包装解码缓冲区，上一帧显示完后归还缓冲池；num 为这一帧的帧号，默认为当前播放位置
+        from video.frames import to_qimage
+        num = self.num if num is None else num
+        start = self.stats.clock()
+        previous, self.current_array = self.current_array, frame
+        self.player.set_image(to_qimage(frame), frame)
+        self.stats.record('convert', start, num)
+        self.stats.frame_shown(num, len(self.decoder.queue) if self.decoder is not None else 0)
+        if self.publisher is not None and not self.publisher.publish(num, self.timestamps.time_of(num), frame):
+            self.stats.count('unpublished')
+        if previous is not None and previous is not frame and self.decoder is not None:
+            self.decoder.release(previous)
+
+    def action_instrument(self):
+        # 开关逐帧耗时统计与叠加显示
+        self.stats.enabled = not self.stats.enabled
+        if self.stats.enabled:
+            self.hud_timer.start()
+            self.update_hud()
         else:
-            return self.player.width(), self.player.width() / (self.video_width / self.video_height)
-
-    def get_frame(self, num=None):
-        if self.video_capture.isOpened():
-            if num is not None:
-                self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, num)
-            success, frame = self.video_capture.read()
-            if success:
-                self.current_frame = QImage(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).flatten(),
-                                            self.video_width, self.video_height, QImage.Format_RGB888)
-                self.player.setPixmap(QPixmap.fromImage(self.current_frame).scaled(*self.get_appropriate_size()))
-            else:
-                if self.num >= self.video_total_frames:
-                    self.timer.pause()
-                    self.button_play.setIcon(QIcon(':play.svg'))
+            self.hud_timer.stop()
+            self.player.set_hud([])
+
+    def action_export_stats(self):
+        path, _ = QFileDialog.getSaveFileName(self, APP_NAME, 'stats.csv', '*.csv;;*.json')
+        if path:
+            self.stats.export(path)
+
+    def update_hud(self):
+        fps = self.timer.fps if self.timer.fps > 0 else DEFAULT_FPS
+        lines = [f'fps {self.stats.fps():.1f} / {fps:.1f}  speed {self.speed * self.direction}x']
+        if self.decoder is not None:
+            lines.append(f'queue {len(self.decoder.queue)} / {self.decoder.queue.depth}  quality {self.quality}')
+            if self.loop is not None and self.loop[1] is not None:
+                cache = self.decoder.loop_cache
+                state = 'streaming' if cache.overflow else f'{len(cache)}/{self.loop[1] - self.loop[0] + 1} cached'
+                lines.append(f'loop {self.loop[0]}-{self.loop[1]}  {state}  {cache.size / 1048576:.0f} MB')
+            if self.scenes is not None:
+                cuts, scanned, complete = self.scenes.snapshot()
+                progress = '' if complete else f'  scanning {scanned * 100 // max(self.video_total_frames, 1)}%'
+                lines.append(f'scenes {len(cuts)}{progress}')
+            filters = self.decoder.filters
+            if filters is not None and filters.enabled:
+                lines.append('filters ' + '  '.join(f'{f} {f.cost * 1000:.1f}' for f in filters.filters) + ' ms')
+        counters = self.stats.snapshot()
+        lines.append(f"dropped {counters['dropped']}  late {counters['late']}  underruns {counters['underruns']}")
+        for name in self.stats.STAGES + ('seek_latency', 'latency', 'av_offset'):
+            p = self.stats.percentiles(name)
+            if p:
+                lines.append(f'{name} ' + '/'.join(f'{value * 1000:.1f}' for value in p.values()) + ' ms')
+        self.player.set_hud(lines)
 
     def keyPressEvent(self, event: QtGui.QKeyEvent):
         if event.key() == QtCore.Qt.Key_Space:
             self.action_play()
+        elif event.key() == QtCore.Qt.Key_U:
+            self.action_open_live()
+        elif event.key() == QtCore.Qt.Key_I:
+            self.action_instrument()
+        elif event.key() == QtCore.Qt.Key_E:
+            self.action_export_stats()
+        elif event.key() == QtCore.Qt.Key_BracketRight:
+            self.change_speed(1)
+        elif event.key() == QtCore.Qt.Key_BracketLeft:
+            self.change_speed(-1)
+        elif event.key() == QtCore.Qt.Key_Backslash:
+            self.set_speed(1)
+        elif event.key() == QtCore.Qt.Key_A:
+            self.action_adaptive()
+        elif event.key() == QtCore.Qt.Key_P:
+            self.action_proxy()
+        elif event.key() == QtCore.Qt.Key_R:
+            self.action_reverse()
+        elif event.key() == QtCore.Qt.Key_Comma:
+            self.action_step(-1)
+        elif event.key() == QtCore.Qt.Key_Period:
+            self.action_step(1)
+        elif event.key() == QtCore.Qt.Key_T:
+            self.action_time()
+        elif event.key() == QtCore.Qt.Key_L:
+            self.action_loop()
+        elif event.key() == QtCore.Qt.Key_F:
+            self.action_filters()
+        elif event.key() == QtCore.Qt.Key_PageDown:
+            self.action_scene(1)
+        elif event.key() == QtCore.Qt.Key_PageUp:
+            self.action_scene(-1)
         event.accept()
 
     def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
-        if not self.timer.playing and self.current_frame:
-            self.player.setPixmap(QPixmap.fromImage(self.current_frame).scaled(*self.get_appropriate_size()))
+        # 调整过程中由 Player 快速拉伸已有画面，停下后再让解码线程按新尺寸缩放
+        if self.decoder is not None:
+            self.decoder.set_quality(False)
+            self.resize_timer.start()
 
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         if self.timer.playing:
@@ -168,12 +811,49 @@ class MainWindow(UI):
                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if close == QMessageBox.No:
                 event.ignore()
+                return
+        self.timer.wait()
+        self.save_position()
+        self.stop_workers()
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    win = MainWindow()
-    style_sheet = open(r'./sources/style.qss', mode='r', encoding='utf-8').read()
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    parser.add_argument('source', nargs='?', help='video file, camera index, URL or named pipe')
+    parser.add_argument('--live', action='store_true', help='treat source as a live stream')
+    parser.add_argument('--wall', nargs='+', metavar='FILE', help='play several files side by side in sync')
+    parser.add_argument('--audio-sink', default=AUDIO_SINK, help='auto, null, or a .wav file to record the audio to')
+    parser.add_argument('--publish', metavar='NAME', help='publish shown frames to this shared memory ring buffer')
+    parser.add_argument('--filter', action='append', default=[], metavar='SPEC',
+                        help='apply a frame filter: crop=x,y,w,h, grayscale, denoise, sharpen, overlay=TEXT '
+                             'or module:function; repeat to chain, F toggles')
+    args, qt_args = parser.parse_known_args()
+    if args.filter:
+        from video.filters import parse_filter
+        for spec in args.filter:
+            try:
+                parse_filter(spec)
+            except ValueError as e:
+                parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO)
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.wall:
+        from wall import WallWindow
+        win = WallWindow(args.wall)
+    else:
+        try:
+            win = MainWindow(args.audio_sink, args.publish, args.filter)
+        except FileExistsError as e:
+            parser.error(str(e))
+    # 样式表相对本文件定位，不依赖启动时的当前目录
+    style_sheet = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sources', 'style.qss'),
+                       mode='r', encoding='utf-8').read()
     win.setStyleSheet(style_sheet)
     win.show()
+    if args.source and not args.wall:
+        win.open_source(args.source, live=args.live)
     sys.exit(app.exec_())
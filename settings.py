@@ -1 +1,96 @@
+import os
+
 APP_NAME = 'Video Player'
+
+# 解码队列：预解码帧数上限与内存上限（字节）
+DECODE_QUEUE_DEPTH = 8
+DECODE_QUEUE_MEMORY = 256 * 1024 * 1024
+
+# 播放时钟：fps 无法获取时的默认值，以及晚于截止时间多少帧间隔计为迟到
+DEFAULT_FPS = 25
+LATE_FRAME_TOLERANCE = 0.5
+
+# 跳转时解码出的帧缓存上限（字节），重复跳转到附近位置时直接复用
+FRAME_CACHE_MEMORY = 512 * 1024 * 1024
+
+# 拖动进度条时，指针停下多久（毫秒）后精确定位到目标帧
+SCRUB_SETTLE_MS = 150
+
+# 解码缓冲池大小：队列深度加上正在显示与正在解码的帧
+FRAME_POOL_SIZE = DECODE_QUEUE_DEPTH + 4
+
+# 调整窗口大小时，停止多久（毫秒）后按最终尺寸高质量重新缩放
+RESIZE_SETTLE_MS = 200
+
+# 直播源打开与读取超时（毫秒）
+LIVE_TIMEOUT_MS = 5000
+
+# 性能叠加显示的刷新间隔（毫秒）
+HUD_INTERVAL_MS = 500
+
+# 可选播放速度，达到 KEYFRAME_ONLY_SPEED 后只解码关键帧
+PLAYBACK_SPEEDS = (0.25, 0.5, 0.75, 1, 1.5, 2, 4, 8, 16)
+KEYFRAME_ONLY_SPEED = 8
+
+# 倒放时关键帧索引尚未建好，每次向前解码多少帧放进缓存
+REVERSE_CHUNK_FRAMES = 50
+
+
+# 磁盘缓存目录与大小上限（字节）：视频元数据、关键帧索引与上次播放位置，超出时淘汰最久未打开的视频
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'video-player')
+CACHE_DISK_LIMIT = 1024 * 1024 * 1024
+
+# 进度条缩略图：宽度（像素）、每个视频最多张数、JPEG 质量，以及解码后缩略图的内存上限（字节）
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_COUNT = 200
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_MEMORY = 16 * 1024 * 1024
+
+# 拖动用代理文件的高度（像素）
+PROXY_HEIGHT = 360
+
+# 自适应画质：每隔 ADAPTIVE_INTERVAL_MS 毫秒检查一次，丢帧比例超过 ADAPTIVE_DROP_RATIO 时降一级；
+# 连续 ADAPTIVE_RECOVER_CHECKS 次没有丢帧且解码线程忙碌比例低于 ADAPTIVE_HEADROOM 时恢复一级
+ADAPTIVE_QUALITY = True
+ADAPTIVE_INTERVAL_MS = 1000
+ADAPTIVE_DROP_RATIO = 0.05
+ADAPTIVE_HEADROOM = 0.5
+ADAPTIVE_RECOVER_CHECKS = 3
+
+# 声音：输出方式（auto 使用声卡，没有声卡时退回 null；null 丢弃声音只按真实时间推进时钟；以 .wav 结尾时写入该文件）、
+# 设备缓冲时长（毫秒），以及 ffmpeg 解码时输出的采样率与声道数
+AUDIO_SINK = 'auto'
+AUDIO_BUFFER_MS = 200
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_CHANNELS = 2
+
+# A/B 循环：第一遍把区间内缩放后的帧放进内存，之后每一遍直接从内存取帧；超出 LOOP_CACHE_MEMORY（字节）时退回逐遍解码。
+# LOOP_CACHE_COMPRESS 为 True 时以 LOOP_CACHE_QUALITY 质量的 JPEG 保存，能放下更长的区间，但取帧时需要解压
+LOOP_CACHE_MEMORY = 512 * 1024 * 1024
+LOOP_CACHE_COMPRESS = False
+LOOP_CACHE_QUALITY = 90
+
+# 共享内存发布（--publish NAME）：环形缓冲区的槽数，以及每个槽能放下的最大帧字节数，更大的帧不发布
+SHARED_SLOTS = 8
+SHARED_FRAME_BYTES = 3840 * 2160 * 3
+
+# 逐帧滤镜（--filter）：线程池大小；每帧平均耗时超过帧间隔时跳过最耗时的可选滤镜，预计恢复后低于帧间隔的
+# FILTER_HEADROOM 倍时再打开，两次调整之间至少处理 FILTER_SETTLE_FRAMES 帧
+FILTER_WORKERS = min(4, os.cpu_count() or 1)
+FILTER_HEADROOM = 0.7
+FILTER_SETTLE_FRAMES = 25
+
+# 镜头切换检测：每帧缩成 SCENE_SIZE 的灰度图，与上一帧的平均绝对差（0~1）超过 SCENE_THRESHOLD 且是最近 SCENE_WINDOW 帧
+# 平均差的 SCENE_RATIO 倍以上时记为切换点，两个切换点至少间隔 SCENE_MIN_FRAMES 帧；每次用 numpy 处理 SCENE_BATCH 帧，
+# 每扫描 SCENE_REPORT_FRAMES 帧更新一次进度；扫描中最多每 SCENE_SAVE_SECONDS 秒把结果存到磁盘缓存一次，
+# 扫描完成或关闭视频时也会保存，下次打开从中断处继续
+SCENE_SIZE = (64, 36)
+SCENE_THRESHOLD = 0.1
+SCENE_RATIO = 2.5
+SCENE_WINDOW = 25
+SCENE_MIN_FRAMES = 10
+SCENE_BATCH = 64
+SCENE_REPORT_FRAMES = 1000
+SCENE_SAVE_SECONDS = 10
+# 往回跳时离当前镜头开头不到 SCENE_BACK_SECONDS 秒就跳到上一个镜头，否则回到当前镜头开头
+SCENE_BACK_SECONDS = 1
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# 音画同步测试：无界面、无声卡播放一段视频，以声音为主时钟，输出画面与声音时钟偏差的分位数，以 JSON 输出。
+# 偏差与选帧用的是同一个时钟，衡量的是视频跟随声音时钟的误差，不包含声卡的输出延迟
+#   python tools/avsync.py video.mp4 --seconds 10
+#   python tools/avsync.py video.mp4 --sink out.wav
+
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+
+from main import MainWindow
+
+
+def run(path, seconds, sink, start):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    win = MainWindow(sink)
+    win.show()
+    win.open_video(path)
+    if start:
+        win.video_jump(int(start * win.video_fps))
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline and win.timer.playing:
+        app.processEvents()
+        time.sleep(0.001)
+    audio = win.audio is not None
+    win.timer.pause()
+    win.timer.wait()
+    win.stop_workers()
+    counters = win.stats.snapshot()
+    offset = win.stats.percentiles('av_offset')
+    return {
+        'audio': audio,
+        'frames': counters['displayed'],
+        'dropped': counters['dropped'],
+        'underruns': counters['underruns'],
+        'av_offset_ms': {f'p{rank}': value * 1000 for rank, value in offset.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--start', type=float, default=0, help='start position in seconds')
+    parser.add_argument('--sink', default='null', help='null, or a .wav file to record the audio to')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.path, args.seconds, args.sink, args.start), indent=2))
@@ -0,0 +1,240 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# 无界面基准测试：生成测试视频（需要 PyAV 或 ffmpeg 按指定的关键帧间隔编码），测量解码、跳转、转换显示的耗时，以 JSON 输出
+#   python tools/benchmark.py --sizes 640x360 1920x1080 --gops 12 250 -o bench.json
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy
+from PyQt5.QtWidgets import QApplication
+
+from interface.UI import Player
+from video.decoder import VideoDecoder
+from video.frames import to_qimage
+from video.index import KeyframeIndex, KeyframeIndexer
+
+
+def synthetic_frames(width, height, frames):
+    # 渐变加噪点，避免编码器把画面压得过于简单
+    x = numpy.arange(width, dtype=numpy.uint8)
+    rng = numpy.random.default_rng(0)
+    for num in range(frames):
+        frame = numpy.empty((height, width, 3), numpy.uint8)
+        frame[:] = (x + num * 4 % 256)[None, :, None]
+        frame[::8, ::8] = rng.integers(0, 255, frame[::8, ::8].shape, numpy.uint8)
+        cv2.putText(frame, str(num), (width // 4, height // 2), cv2.FONT_HERSHEY_SIMPLEX, height / 120, (0, 0, 255), 3)
+        yield frame
+
+
+def create_video(path, width, height, gop, frames, fps=25):
+    # cv2.VideoWriter 的 mp4v 编码器忽略 VIDEOWRITER_PROP_KEY_INTERVAL，固定每 12 帧一个关键帧，
+    # 这里用 PyAV 或 ffmpeg 命令行按 gop 编码，并关掉场景切换时自动插入的关键帧
+    if os.path.exists(path):
+        return path
+    # 先写到临时文件，完整写完后再改名，避免中断后复用半个文件
+    partial = path + '.partial.mp4'
+    bit_rate = width * height * fps // 4
+    try:
+        import av
+    except ImportError:
+        av = None
+    if av is not None:
+        container = av.open(partial, 'w')
+        stream = container.add_stream('mpeg4', rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, 'yuv420p'
+        stream.bit_rate = bit_rate
+        stream.codec_context.gop_size = gop
+        stream.options = {'sc_threshold': '1000000000'}
+        for frame in synthetic_frames(width, height, frames):
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(frame, format='bgr24')))
+        container.mux(stream.encode())
+        container.close()
+    elif shutil.which('ffmpeg'):
+        process = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+             '-r', str(fps), '-i', '-', '-c:v', 'mpeg4', '-b:v', str(bit_rate), '-g', str(gop),
+             '-sc_threshold', '1000000000', '-pix_fmt', 'yuv420p', partial], stdin=subprocess.PIPE)
+        for frame in synthetic_frames(width, height, frames):
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+        if process.wait():
+            raise RuntimeError(f'ffmpeg failed to encode {path}')
+    else:
+        raise RuntimeError('generating test videos with a given GOP needs PyAV (pip install av) or ffmpeg')
+    os.replace(partial, path)
+    return path
+
+
+def keyframe_interval(index):
+    # 实际的关键帧间隔：相邻关键帧间距中最常见的值，只有一个关键帧时为 None
+    keyframes = index.keyframes
+    spacings = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    return max(set(spacings), key=spacings.count) if spacings else None
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda rank: values[min(len(values) - 1, len(values) * rank // 100)] * 1000
+    return {'p50_ms': pick(50), 'p90_ms': pick(90), 'p99_ms': pick(99), 'max_ms': values[-1] * 1000}
+
+
+def wait(app, condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def build_index(path):
+    index = KeyframeIndex()
+    indexer = KeyframeIndexer(path, index)
+    start = time.perf_counter()
+    indexer.start()
+    indexer.wait()
+    return index, time.perf_counter() - start
+
+
+def bench_decode(app, path, output_size):
+    decoder = VideoDecoder(cv2.VideoCapture(path))
+    if output_size:
+        decoder.set_output_size(*output_size)
+    start = time.perf_counter()
+    decoder.start()
+    frames = 0
+    while True:
+        item = decoder.get()
+        if item is None:
+            if decoder.eof and not len(decoder.queue):
+                break
+            time.sleep(0.0005)
+            continue
+        frames += 1
+        decoder.release(item[1])
+    elapsed = time.perf_counter() - start
+    decoder.stop()
+    return {'frames': frames, 'seconds': elapsed, 'fps': frames / elapsed if elapsed else 0,
+            'underruns': decoder.stats.get('underruns')}
+
+
+def bench_seek(app, path, index, total, count):
+    decoder = VideoDecoder(cv2.VideoCapture(path), index=index)
+    received = {}
+    decoder.signal_frame.connect(lambda num, frame, requested: received.__setitem__(num, time.perf_counter() - requested))
+    decoder.start()
+    rng = random.Random(0)
+    latencies = []
+    for target in [rng.randrange(total) for _ in range(count)]:
+        received.clear()
+        decoder.seek(target)
+        wait(app, lambda: target in received)
+        latencies.append(received[target])
+    decoder.stop()
+    return percentiles(latencies)
+
+
+def bench_render(app, path, output_size, count):
+    # 与 MainWindow.show_frame 相同：包装为 QImage 并由 Player 直接绘制
+    player = Player()
+    player.resize(*output_size)
+    player.show()
+    # 等窗口真正显示后 repaint 才会执行绘制
+    app.processEvents()
+    video_capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        success, frame = video_capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    video_capture.release()
+    decoder = VideoDecoder(cv2.VideoCapture(path))
+    decoder.set_output_size(*output_size)
+    scale, convert, paint = [], [], []
+    for frame in frames:
+        start = time.perf_counter()
+        scaled = decoder.scale(frame)
+        scale.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        image = to_qimage(scaled)
+        convert.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        player.set_image(image, scaled)
+        player.repaint()
+        paint.append(time.perf_counter() - start)
+    decoder.video_capture.release()
+    player.close()
+    return {'scale': percentiles(scale), 'convert': percentiles(convert), 'paint': percentiles(paint)}
+
+
+def run(sizes, gops, frames, seeks, workdir):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = []
+    for width, height in sizes:
+        for gop in gops:
+            # 文件名带上编码器，不复用以前用 mp4v 写出、关键帧间隔不对的文件
+            name = f'bench_{width}x{height}_gop{gop}_mpeg4.mp4'
+            path = create_video(os.path.join(workdir, name), width, height, gop, frames)
+            output_size = (width // 2, height // 2)
+            index, index_seconds = build_index(path)
+            total = index.scanned
+            # 以读回的关键帧间隔为准；只有一个关键帧时 gop 超过了总帧数
+            actual = keyframe_interval(index)
+            if actual is not None and actual != gop:
+                print(f'warning: {name} has a keyframe every {actual} frames, not {gop}', file=sys.stderr)
+            results.append({
+                'video': {'width': width, 'height': height, 'gop': gop, 'gop_actual': actual, 'frames': total,
+                          'keyframes': len(index)},
+                'index_seconds': index_seconds,
+                'decode': bench_decode(app, path, None),
+                'decode_scaled': bench_decode(app, path, output_size),
+                'seek': bench_seek(app, path, index, total, seeks),
+                'render': bench_render(app, path, output_size, min(frames, 100)),
+            })
+    return {
+        'opencv': cv2.__version__,
+        'results': results,
+        # Linux 下 ru_maxrss 单位为 KB
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(640, 360), (1280, 720), (1920, 1080)])
+    parser.add_argument('--gops', nargs='+', type=int, default=[12, 60, 250])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--seeks', type=int, default=50)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'video-player-bench'))
+    parser.add_argument('-o', '--output', help='write JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = json.dumps(run(args.sizes, args.gops, args.frames, args.seeks, args.workdir), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# 把视频文件按原始帧率以 MJPEG 流写入命名管道，用于测试直播模式：
+#   python tools/replay_fifo.py video.mp4 /tmp/video.pipe
+#   python main.py /tmp/video.pipe
+
+import argparse
+import os
+import stat
+import time
+
+import cv2
+
+
+def replay(video_url, fifo, loop=False, quality=90):
+    if not os.path.exists(fifo):
+        os.mkfifo(fifo)
+    elif not stat.S_ISFIFO(os.stat(fifo).st_mode):
+        raise SystemExit(f'{fifo} is not a named pipe')
+
+    video_capture = cv2.VideoCapture(video_url)
+    fps = video_capture.get(cv2.CAP_PROP_FPS) or 25
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    # 打开管道会阻塞到播放器开始读取
+    with open(fifo, 'wb') as f:
+        start = time.monotonic()
+        num = 0
+        while True:
+            success, frame = video_capture.read()
+            if not success:
+                if not loop:
+                    break
+                video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            try:
+                f.write(cv2.imencode('.jpg', frame, params)[1].tobytes())
+                f.flush()
+            except BrokenPipeError:
+                break
+            num += 1
+            delay = start + num / fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    video_capture.release()
+    print(f'{num} frames written')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('fifo')
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--quality', type=int, default=90)
+    args = parser.parse_args()
+
+    replay(args.video, args.fifo, args.loop, args.quality)
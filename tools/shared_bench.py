@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# 共享内存发布吞吐测试：主进程按最快速度发布合成帧，若干读取进程零拷贝读取，可以让其中一个故意读得很慢，
+# 检查慢的读取方不会拖慢发布，以 JSON 输出
+#   python tools/shared_bench.py --size 1920x1080 --seconds 5 --readers 2 --slow-reader
+#   python tools/shared_bench.py --fps 60 --slow-reader
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+
+from video.shared import FramePublisher, FrameReader
+
+
+def read_frames(name, delay, results):
+    reader = FrameReader(name)
+    received = torn = 0
+    start = None
+    for sequence, num, msec, frame in reader.frames(copy=False, timeout=1):
+        start = start or time.perf_counter()
+        # 只读取一部分像素，模拟分析进程访问数据
+        int(frame[::64, ::64].sum())
+        if delay:
+            time.sleep(delay)
+        if reader.valid(sequence):
+            received += 1
+        else:
+            torn += 1
+        del frame
+    elapsed = time.perf_counter() - start if start else 0
+    results.put({'delay_ms': delay * 1000, 'received': received, 'missed': reader.missed, 'torn': torn,
+                 'fps': received / elapsed if elapsed else 0})
+    reader.close()
+
+
+def run(width, height, seconds, fps, readers, slow, name):
+    publisher = FramePublisher(name, slot_bytes=width * height * 3)
+    frames = [numpy.full((height, width, 3), i * 80, numpy.uint8) for i in range(3)]
+    results = multiprocessing.Queue()
+    delays = [0.0] * readers + ([0.05] if slow else [])
+    processes = [multiprocessing.Process(target=read_frames, args=(name, delay, results)) for delay in delays]
+    for process in processes:
+        process.start()
+    # 等读取进程附加上再开始计时
+    time.sleep(0.5)
+    published = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        publisher.publish(published, published * 40.0, frames[published % len(frames)])
+        published += 1
+        if fps:
+            # 按播放帧率发布
+            time.sleep(max(0.0, start + published / fps - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    publisher.close()
+    return {
+        'frame': f'{width}x{height}',
+        'published': published,
+        'publish_fps': published / elapsed,
+        'publish_gb_per_s': published * width * height * 3 / elapsed / 1e9,
+        'readers': reports,
+    }
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=parse_size, default=(1920, 1080))
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=float, default=0, help='publish rate, 0 publishes as fast as possible')
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--slow-reader', action='store_true', help='add a reader that sleeps 50 ms per frame')
+    parser.add_argument('--name', default=f'video-player-bench-{os.getpid()}')
+    args = parser.parse_args()
+
+    print(json.dumps(run(*args.size, args.seconds, args.fps, args.readers, args.slow_reader, args.name), indent=2))
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+# 冷启动基准测试：在新进程中测量导入、创建窗口到第一次绘制欢迎界面的耗时，以 JSON 输出
+#   python tools/startup.py --runs 20
+#   python tools/startup.py --open video.mp4
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行，每次都是全新的解释器
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, sys.argv[1])
+import main
+imported = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+win = main.MainWindow()
+created = time.perf_counter()
+painted = []
+paint = win.player.paintEvent
+def paint_event(event):
+    paint(event)
+    painted.append(time.perf_counter())
+win.player.paintEvent = paint_event
+win.show()
+while not painted:
+    app.processEvents()
+result = {
+    'import': imported - start,
+    'window': created - imported,
+    'first_paint': painted[0] - start,
+    'cv2_loaded': 'cv2' in sys.modules,
+    'numpy_loaded': 'numpy' in sys.modules,
+}
+if len(sys.argv) > 2:
+    opening = time.perf_counter()
+    win.open_video(sys.argv[2])
+    result['open'] = time.perf_counter() - opening
+    win.timer.pause()
+    win.timer.wait()
+    win.stop_workers()
+print(json.dumps(result))
+'''
+
+
+def measure(video=None):
+    args = [sys.executable, '-c', PROBE, ROOT] + ([video] if video else [])
+    output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs, video=None):
+    results = [measure(video) for _ in range(runs)]
+    report = {'runs': runs, 'cv2_loaded': results[0]['cv2_loaded'], 'numpy_loaded': results[0]['numpy_loaded']}
+    for name in ('import', 'window', 'first_paint', 'open'):
+        values = [result[name] for result in results if name in result]
+        if values:
+            report[name] = {'median_ms': statistics.median(values) * 1000, 'min_ms': min(values) * 1000}
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--open', help='also time opening this video after the first paint')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.runs, args.open), indent=2))
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*- 
+# !/usr/bin/env python3
+
+# Name: __init__.py
+# Author: https://github.com/536
+# Create Time: 2026-10-18 20:00
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+from settings import ADAPTIVE_DROP_RATIO, ADAPTIVE_HEADROOM, ADAPTIVE_RECOVER_CHECKS
+
+
+class AdaptiveQuality(object):
+    # 按顺序逐级降低：快速缩放、半分辨率、只解码关键帧
+    LEVELS = ('full', 'fast scaling', 'half resolution', 'keyframes only')
+
+    def __init__(self):
+        self.level = 0
+        self.calm = 0
+
+    def reset(self):
+        self.level = 0
+        self.calm = 0
+
+    def update(self, missed, expected, busy):
+        # missed 为本次检查间隔内丢掉或没取到的帧数，expected 为应显示的帧数，busy 为解码线程的忙碌比例
+        # 返回新的级别，没有变化时返回 None
+        if expected <= 0:
+            return None
+        if missed > expected * ADAPTIVE_DROP_RATIO:
+            self.calm = 0
+            if self.level < len(self.LEVELS) - 1:
+                self.level += 1
+                return self.level
+            return None
+        if missed or busy > ADAPTIVE_HEADROOM:
+            self.calm = 0
+            return None
+        # 连续几次都有余量才恢复一级，避免在两级之间来回切换
+        self.calm += 1
+        if self.level and self.calm >= ADAPTIVE_RECOVER_CHECKS:
+            self.calm = 0
+            self.level -= 1
+            return self.level
+        return None
+
+    def __str__(self):
+        return self.LEVELS[self.level]
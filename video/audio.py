@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import logging
+import os
+import shutil
+import subprocess
+import time
+import wave
+
+import cv2
+import numpy
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, QWaitCondition, pyqtSignal
+
+from settings import AUDIO_BUFFER_MS, AUDIO_CHANNELS, AUDIO_SAMPLE_RATE, AUDIO_SINK
+
+logger = logging.getLogger(__name__)
+
+# 每次从音源读取的样本数（每个声道）
+CHUNK_FRAMES = 4096
+
+
+class CvAudioSource(object):
+    # OpenCV 的音频流，需要 MSMF、GStreamer 等支持音频的后端
+    def __init__(self, video_url):
+        params = [cv2.CAP_PROP_AUDIO_STREAM, 0, cv2.CAP_PROP_VIDEO_STREAM, -1,
+                  cv2.CAP_PROP_AUDIO_DATA_DEPTH, cv2.CV_16S]
+        # 不支持音频的后端会打印错误日志，这里只是试探
+        level = cv2.utils.logging.getLogLevel()
+        cv2.utils.logging.setLogLevel(cv2.utils.logging.LOG_LEVEL_SILENT)
+        try:
+            self.capture = cv2.VideoCapture(video_url, cv2.CAP_ANY, params)
+        finally:
+            cv2.utils.logging.setLogLevel(level)
+        self.rate = int(self.capture.get(cv2.CAP_PROP_AUDIO_SAMPLES_PER_SECOND))
+        self.channels = int(self.capture.get(cv2.CAP_PROP_AUDIO_TOTAL_CHANNELS))
+        self.base = int(self.capture.get(cv2.CAP_PROP_AUDIO_BASE_INDEX))
+
+    def opened(self):
+        return self.capture.isOpened() and self.rate > 0 and self.channels > 0
+
+    def read(self):
+        if not self.capture.grab():
+            return None
+        channels = []
+        for i in range(self.channels):
+            success, samples = self.capture.retrieve(None, self.base + i)
+            if not success or samples is None:
+                return numpy.empty((0, self.channels), numpy.int16)
+            channels.append(samples.reshape(-1))
+        return numpy.stack(channels, axis=1)
+
+    def seek(self, msec):
+        self.capture.set(cv2.CAP_PROP_POS_MSEC, msec)
+
+    def close(self):
+        self.capture.release()
+
+
+class FfmpegAudioSource(object):
+    # OpenCV 不支持音频时由 ffmpeg 命令行解码成 16 位 PCM，跳转时从新位置重新启动
+    def __init__(self, video_url, rate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS):
+        self.video_url = video_url
+        self.rate = rate
+        self.channels = channels
+        self.process = None
+        self.first = None
+        self.seek(0)
+        # 没有音轨时 ffmpeg 直接退出，读不到任何数据
+        self.first = self.read()
+
+    def opened(self):
+        return self.first is not None
+
+    def read(self):
+        if self.first is not None:
+            samples, self.first = self.first, None
+            return samples
+        frame_bytes = 2 * self.channels
+        data = self.process.stdout.read(CHUNK_FRAMES * frame_bytes)
+        if len(data) < frame_bytes:
+            return None
+        return numpy.frombuffer(data[:len(data) - len(data) % frame_bytes], numpy.int16).reshape(-1, self.channels)
+
+    def seek(self, msec):
+        self.close()
+        self.first = None
+        self.process = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-nostdin', '-ss', f'{msec / 1000:.3f}', '-i', self.video_url, '-vn',
+             '-ac', str(self.channels), '-ar', str(self.rate), '-f', 's16le', '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def close(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.stdout.close()
+            self.process.wait()
+            self.process = None
+
+
+class WavAudioSource(object):
+    # 16 位 PCM 的 wav 文件
+    def __init__(self, path):
+        self.wav = wave.open(path, 'rb')
+        self.rate = self.wav.getframerate()
+        self.channels = self.wav.getnchannels()
+
+    def opened(self):
+        return self.wav.getsampwidth() == 2
+
+    def read(self):
+        data = self.wav.readframes(CHUNK_FRAMES)
+        if not data:
+            return None
+        return numpy.frombuffer(data, numpy.int16).reshape(-1, self.channels)
+
+    def seek(self, msec):
+        self.wav.setpos(min(max(int(msec * self.rate / 1000), 0), self.wav.getnframes()))
+
+    def close(self):
+        self.wav.close()
+
+
+def open_audio(video_url):
+    # 视频旁边的同名 .wav 优先，其次是 OpenCV 音频流和 ffmpeg 命令行，都没有时返回 None
+    stem, ext = os.path.splitext(video_url)
+    candidates = []
+    if os.path.isfile(stem + '.wav'):
+        candidates.append(lambda: WavAudioSource(stem + '.wav'))
+    if ext.lower() != '.wav':
+        candidates.append(lambda: CvAudioSource(video_url))
+        if shutil.which('ffmpeg'):
+            candidates.append(lambda: FfmpegAudioSource(video_url))
+    for create in candidates:
+        try:
+            source = create()
+        except (OSError, EOFError, wave.Error) as e:
+            logger.info('audio source failed: %s', e)
+            continue
+        if source.opened():
+            logger.info('audio: %s, %d Hz, %d channels', type(source).__name__, source.rate, source.channels)
+            return source
+        source.close()
+    return None
+
+
+class NullSink(object):
+    # 丢弃声音，按真实时间消耗缓冲区中的样本；没有声卡或离线测试时同样可以驱动声音时钟
+    def __init__(self):
+        self.rate = 0
+        self.channels = 0
+        # buffered 为缓冲区中还没播放的样本数，consumed 为 reset 之后已播放的样本数，last 为上次结算的时刻，暂停时为 None
+        self.buffered = 0
+        self.consumed = 0
+        self.last = None
+
+    def open(self, rate, channels):
+        self.rate = rate
+        self.channels = channels
+        self.reset()
+
+    def consume(self):
+        # 缓冲区播空后时钟停住，与声卡欠载时的表现一致
+        if self.last is None:
+            return
+        now = time.monotonic()
+        n = min(self.buffered, (now - self.last) * self.rate)
+        self.buffered -= n
+        self.consumed += n
+        self.last = now
+
+    def write(self, samples):
+        # 不阻塞，返回接受的样本数，缓冲区满时返回 0
+        self.consume()
+        n = max(0, min(len(samples), int(self.rate * AUDIO_BUFFER_MS / 1000 - self.buffered)))
+        if n:
+            self.output(samples[:n])
+            self.buffered += n
+        return n
+
+    def output(self, samples):
+        pass
+
+    def played(self):
+        self.consume()
+        return self.consumed / self.rate if self.rate else 0
+
+    def pause(self):
+        self.consume()
+        self.last = None
+
+    def resume(self):
+        if self.last is None:
+            self.last = time.monotonic()
+
+    def reset(self):
+        self.buffered = 0
+        self.consumed = 0
+        if self.last is not None:
+            self.last = time.monotonic()
+
+    def close(self):
+        pass
+
+
+class WavSink(NullSink):
+    # 按真实时间播放的同时把送出的声音写进 wav 文件
+    def __init__(self, path):
+        super(WavSink, self).__init__()
+        self.path = path
+        self.wav = None
+
+    def open(self, rate, channels):
+        super(WavSink, self).open(rate, channels)
+        self.wav = wave.open(self.path, 'wb')
+        self.wav.setnchannels(channels)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(rate)
+
+    def output(self, samples):
+        self.wav.writeframes(samples.tobytes())
+
+    def close(self):
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+class QtSink(object):
+    # 通过 QAudioOutput 输出到声卡；QAudioOutput 属于创建它的线程，open 与其它方法都在音频线程中调用
+    def __init__(self):
+        self.output = None
+        self.device = None
+        self.events = None
+        self.rate = 0
+        self.frame_bytes = 0
+
+    def open(self, rate, channels):
+        from PyQt5.QtCore import QEventLoop
+        from PyQt5.QtMultimedia import QAudioFormat, QAudioOutput
+        audio_format = QAudioFormat()
+        audio_format.setSampleRate(rate)
+        audio_format.setChannelCount(channels)
+        audio_format.setSampleSize(16)
+        audio_format.setCodec('audio/pcm')
+        audio_format.setByteOrder(QAudioFormat.LittleEndian)
+        audio_format.setSampleType(QAudioFormat.SignedInt)
+        self.rate = rate
+        self.frame_bytes = 2 * channels
+        self.output = QAudioOutput(audio_format)
+        self.output.setBufferSize(int(rate * AUDIO_BUFFER_MS / 1000) * self.frame_bytes)
+        self.events = QEventLoop()
+        self.device = self.output.start()
+
+    def write(self, samples):
+        # 音频线程没有运行事件循环，写入前处理一次 QAudioOutput 的内部事件
+        self.events.processEvents()
+        n = min(len(samples), self.output.bytesFree() // self.frame_bytes)
+        if n <= 0:
+            return 0
+        return max(self.device.write(samples[:n].tobytes()), 0) // self.frame_bytes
+
+    def played(self):
+        # processedUSecs 统计的是已经交给设备的数据，减去缓冲区中还没播出的部分才是听到的位置；
+        # 声卡驱动之后的延迟 QAudioOutput 拿不到，不包含在内
+        unplayed = (self.output.bufferSize() - self.output.bytesFree()) / self.frame_bytes / self.rate
+        return max(self.output.processedUSecs() / 1000000 - unplayed, 0)
+
+    def pause(self):
+        self.output.suspend()
+
+    def resume(self):
+        self.output.resume()
+
+    def reset(self):
+        # 重新 start 后 processedUSecs 从 0 开始计
+        self.output.reset()
+        self.device = self.output.start()
+
+    def close(self):
+        if self.output is not None:
+            self.output.stop()
+
+
+def create_sink(name=AUDIO_SINK):
+    # null 只推进时钟，以 .wav 结尾时写入文件，auto 使用声卡，QtMultimedia 不可用时退回 null
+    if name.lower().endswith('.wav'):
+        return WavSink(name)
+    if name == 'null':
+        return NullSink()
+    try:
+        from PyQt5.QtMultimedia import QAudioDeviceInfo
+    except ImportError as e:
+        logger.info('no audio output (%s), using the null sink', e)
+        return NullSink()
+    if QAudioDeviceInfo.defaultOutputDevice().isNull():
+        logger.info('no audio output device, using the null sink')
+        return NullSink()
+    return QtSink()
+
+
+class AudioPlayer(QThread):
+    # 解码与输出都在这个线程中，界面线程只通过 clock() 读取声音时钟；参数为是否找到音轨
+    signal_opened = pyqtSignal(bool)
+
+    def __init__(self, video_url, sink=None):
+        super(AudioPlayer, self).__init__()
+        self.video_url = video_url
+        self.sink = sink if sink is not None else NullSink()
+        self.stopping = False
+        self.paused = True
+        self.seek_target = None
+        # base 为最近一次跳转到的媒体时间（毫秒），played 为之后播放的秒数，written 为之后送出的秒数，
+        # updated 为最近一次更新 played 的时刻
+        self.base = 0
+        self.played = 0
+        self.written = 0
+        self.updated = None
+        self.drained = False
+        self.mutex = QMutex()
+        self.wake = QWaitCondition()
+
+    def run(self):
+        source = open_audio(self.video_url)
+        if source is None:
+            logger.info('no audio track: %s', self.video_url)
+            self.signal_opened.emit(False)
+            return
+        self.sink.open(source.rate, source.channels)
+        self.signal_opened.emit(True)
+        pending = None
+        eof = False
+        paused = None
+        try:
+            while True:
+                with QMutexLocker(self.mutex):
+                    if self.stopping:
+                        break
+                    target, self.seek_target = self.seek_target, None
+                    if target is None and self.paused and paused:
+                        self.wake.wait(self.mutex)
+                        continue
+                    changed, paused = paused != self.paused, self.paused
+                if target is not None:
+                    source.seek(target)
+                    self.sink.reset()
+                    pending, eof = None, False
+                    with QMutexLocker(self.mutex):
+                        self.base, self.played, self.written, self.updated = target, 0, 0, None
+                        self.drained = False
+                    # reset 可能让设备重新开始播放，重新应用暂停状态
+                    changed = True
+                if changed:
+                    [self.sink.resume, self.sink.pause][paused]()
+                if paused:
+                    continue
+                if pending is None and not eof:
+                    pending = source.read()
+                    eof = pending is None
+                accepted = 0
+                if pending is not None:
+                    accepted = self.sink.write(pending)
+                    pending = pending[accepted:] if accepted < len(pending) else None
+                self.update(self.sink.played(), accepted / source.rate, eof)
+                if not accepted:
+                    # 设备缓冲区已满或已经读完，等缓冲区消耗一部分再写
+                    self.msleep(max(1, AUDIO_BUFFER_MS // 10))
+        finally:
+            self.sink.close()
+            source.close()
+
+    def update(self, played, written, eof):
+        with QMutexLocker(self.mutex):
+            self.played = played
+            self.written += written
+            self.updated = time.monotonic()
+            self.drained = eof and played >= self.written - 0.001
+
+    def clock(self):
+        # 正在播放的声音对应的媒体时间（毫秒）；暂停、跳转中或声音已经播完时返回 None，由视频时钟接管
+        with QMutexLocker(self.mutex):
+            if self.updated is None or self.paused or self.drained or self.seek_target is not None:
+                return None
+            # 两次更新之间按真实时间推算，但不超过已经送出的声音
+            played = min(self.played + time.monotonic() - self.updated, self.written)
+            return self.base + played * 1000
+
+    def pause(self):
+        with QMutexLocker(self.mutex):
+            self.paused = True
+            self.wake.wakeAll()
+
+    def resume(self):
+        with QMutexLocker(self.mutex):
+            self.paused = False
+            self.wake.wakeAll()
+
+    def seek(self, msec):
+        with QMutexLocker(self.mutex):
+            self.seek_target = max(msec, 0)
+            self.wake.wakeAll()
+
+    def stop(self):
+        with QMutexLocker(self.mutex):
+            self.stopping = True
+            self.wake.wakeAll()
+        self.wait()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import hashlib
+import json
+import os
+import shutil
+
+from PyQt5.QtCore import QMutex, QMutexLocker
+
+from settings import CACHE_DIR, CACHE_DISK_LIMIT
+
+
+def cache_key(video_url):
+    # 以路径、大小和修改时间区分文件，文件被替换或修改后缓存自动失效
+    try:
+        st = os.stat(video_url)
+    except OSError:
+        return None
+    text = f'{os.path.abspath(video_url)}|{st.st_size}|{st.st_mtime_ns}'
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def write_file(path, text):
+    # 先写临时文件再改名，中途退出也不会留下半个文件
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+
+def directory_size(directory):
+    size = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+class VideoCache(object):
+    # 每个视频一个目录，info.json 存元数据、索引与播放位置，其它文件放在同一目录下
+    INFO = 'info.json'
+
+    def __init__(self, video_url, root=CACHE_DIR, limit=CACHE_DISK_LIMIT):
+        self.root = root
+        self.limit = limit
+        key = cache_key(video_url)
+        self.directory = os.path.join(root, key) if key else None
+        self.mutex = QMutex()
+        self.info = self.load()
+
+    def load(self):
+        if self.directory is None:
+            return {}
+        try:
+            with open(os.path.join(self.directory, self.INFO), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, name, default=None):
+        with QMutexLocker(self.mutex):
+            return self.info.get(name, default)
+
+    def set(self, **values):
+        if self.directory is None:
+            return
+        with QMutexLocker(self.mutex):
+            self.info.update(values)
+            write_file(self.path(self.INFO), json.dumps(self.info))
+
+    def load_json(self, name, default=None):
+        # info.json 之外单独保存的数据；经常更新的数据放在单独的文件里，不必每次重写整个 info.json
+        if self.directory is None:
+            return default
+        try:
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def save_json(self, name, value):
+        if self.directory is not None:
+            write_file(self.path(name), json.dumps(value))
+
+    def path(self, name):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, name)
+
+    def touch(self):
+        # 以 info.json 的修改时间作为最近使用时间
+        if self.directory is not None and os.path.exists(os.path.join(self.directory, self.INFO)):
+            os.utime(os.path.join(self.directory, self.INFO))
+
+    def evict(self):
+        # 总大小超过上限时，按最近使用时间删除最旧的视频目录，当前视频除外
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            try:
+                used = os.path.getmtime(os.path.join(directory, self.INFO))
+            except OSError:
+                used = 0
+            entries.append((used, directory, directory_size(directory)))
+        total = sum(size for _, _, size in entries)
+        for _, directory, size in sorted(entries):
+            if total <= self.limit:
+                break
+            if directory == self.directory:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+
+    def __bool__(self):
+        return self.directory is not None
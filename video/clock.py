@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import time
+
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, pyqtSignal
+
+from settings import DEFAULT_FPS, LATE_FRAME_TOLERANCE
+from video.stats import PlaybackStats
+
+
+class VideoTimer(QThread):
+    # 参数为显示本帧前需要跳过的帧数
+    signal_update_frame = pyqtSignal(int)
+    signal_finished = pyqtSignal()
+
+    def __init__(self, stats=None):
+        super(VideoTimer, self).__init__()
+        self.playing = False
+        self.pending = False
+        self.fps = 0
+        self.speed = 1
+        self.stats = stats or PlaybackStats()
+        self.mutex = QMutex()
+
+    @property
+    def interval(self):
+        # 慢放时拉长每帧的显示时间；快进时按原帧率刷新，每次前进多帧
+        fps = self.fps if self.fps > 0 else DEFAULT_FPS
+        return 1 / (fps * min(self.speed, 1))
+
+    def set_speed(self, speed):
+        with QMutexLocker(self.mutex):
+            self.speed = speed
+
+    def start(self, priority=QThread.InheritPriority):
+        # 在启动线程之前就标记为播放中，紧接着调用 pause() 时不会被 run() 覆盖
+        with QMutexLocker(self.mutex):
+            self.playing = True
+            self.pending = False
+        super(VideoTimer, self).start(priority)
+
+    def run(self):
+        # 每一帧都对齐到绝对截止时间，避免 sleep 误差累积
+        interval, advance = self.interval, max(self.speed, 1)
+        start = time.monotonic()
+        n = 0
+        # base 为当前速度下起始的帧偏移，last 为上一次发出的帧偏移
+        base = 0
+        last = -1
+        missed = 0
+        while self.playing:
+            if (self.interval, max(self.speed, 1)) != (interval, advance):
+                # 速度或帧率改变，从当前位置重新计时
+                interval, advance = self.interval, max(self.speed, 1)
+                start = time.monotonic()
+                n = 0
+                base = last + 1
+            deadline = start + n * interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            late = time.monotonic() - deadline
+            with QMutexLocker(self.mutex):
+                busy = self.pending
+                if not busy:
+                    self.pending = True
+            if busy:
+                # 界面还没显示上一帧，这一帧直接丢弃
+                missed += 1
+            else:
+                if late >= interval:
+                    behind = int(late / interval)
+                    missed += behind
+                    n += behind
+                elif late > interval * LATE_FRAME_TOLERANCE:
+                    self.stats.count('late')
+                if missed:
+                    self.stats.count('dropped', missed)
+                    missed = 0
+                frame = base + int(n * advance)
+                self.signal_update_frame.emit(frame - last - 1)
+                last = frame
+            n += 1
+        self.signal_finished.emit()
+
+    def frame_shown(self):
+        with QMutexLocker(self.mutex):
+            self.pending = False
+
+    def pause(self):
+        with QMutexLocker(self.mutex):
+            self.playing = False
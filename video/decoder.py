@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import time
+
+import cv2
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, QWaitCondition, pyqtSignal
+
+from settings import KEYFRAME_ONLY_SPEED, REVERSE_CHUNK_FRAMES
+from video.filters import FilterPipeline
+from video.frames import FrameCache, FramePool, FrameQueue, LoopCache
+from video.index import KeyframeIndex
+from video.stats import PlaybackStats
+
+
+class VideoDecoder(QThread):
+    # 帧号、帧、对应跳转请求的时间戳
+    signal_frame = pyqtSignal(int, object, float)
+
+    def __init__(self, video_capture, stats=None, index=None, timestamps=None):
+        super(VideoDecoder, self).__init__()
+        self.video_capture = video_capture
+        self.stats = stats or PlaybackStats()
+        self.index = index if index is not None else KeyframeIndex()
+        # 可变帧率视频按显示时间跳转，见 seek_time
+        self.timestamps = timestamps
+        # source_pool 存放解码出的原始尺寸帧，pool 存放缩放后交给界面的帧
+        self.source_pool = FramePool()
+        self.pool = FramePool()
+        self.queue = FrameQueue(recycle=self.release)
+        self.cache = FrameCache()
+        self.shape = (int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                      int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        # num 为下一帧要输出的帧号，position 为 VideoCapture 下一次 read 得到的帧号
+        self.num = int(video_capture.get(cv2.CAP_PROP_POS_FRAMES))
+        self.position = self.num
+        self.eof = False
+        self.stopping = False
+        self.seek_target = None
+        self.skip_to = None
+        # 快进时每次前进的帧数，以及是否只解码关键帧；direction 为 -1 时倒放
+        self.step = 1
+        self.direction = 1
+        self.keyframes_only = False
+        # 单帧 grab 与一次 set(CAP_PROP_POS_FRAMES) 的耗时估计，用来决定向后 grab 还是跳转
+        self.grab_cost = 0.005
+        self.seek_cost = 0.1
+        self.output_size = None
+        self.smooth = False
+        # 自适应画质级别（见 AdaptiveQuality），busy 为累计解码与缩放耗时
+        self.degrade = 0
+        self.busy = 0.0
+        # A/B 循环区间，正向播放时帧号一直增加，超过 B 点后由 fold 折回；区间内的输出帧放进 loop_cache
+        self.loop = None
+        self.loop_cache = LoopCache()
+        # 逐帧滤镜，见 set_filters
+        self.filters = None
+        self.mutex = QMutex()
+        self.wake = QWaitCondition()
+
+    def run(self):
+        while True:
+            with QMutexLocker(self.mutex):
+                # 到达结尾后等待跳转或停止
+                while self.eof and self.seek_target is None and not self.stopping:
+                    self.wake.wait(self.mutex)
+                if self.stopping:
+                    break
+                target, self.seek_target = self.seek_target, None
+                skip_to, self.skip_to = self.skip_to, None
+                step, direction = self.step, self.direction
+                keyframes_only = self.keyframes_only or self.degrade >= 3
+            if target is not None:
+                self.do_seek(target)
+                continue
+            if skip_to is not None and (skip_to - self.num) * direction > 0:
+                # 跳过的帧不在这里解码，由 locate 决定 grab 前进还是跳到关键帧
+                self.num = skip_to
+            num = self.num
+            if num < 0:
+                # 倒放到了开头
+                self.set_eof()
+                continue
+            source = self.fold(num)
+            if keyframes_only:
+                keyframe = self.index.ceil(source) if direction > 0 else self.index.floor(source)
+                if keyframe is not None:
+                    num += keyframe - source
+                    source = keyframe
+            busy = time.perf_counter()
+            # 循环的第二遍起直接从内存取缩放好的帧，不再解码
+            frame = self.loop_frame(source)
+            cached = frame is not None
+            if cached:
+                self.stats.count('cache_hits')
+            elif direction > 0 or keyframes_only:
+                frame = self.read(source)
+            else:
+                frame = self.read_reverse(source)
+            if frame is None:
+                continue
+            self.num = num + step * direction
+            with QMutexLocker(self.mutex):
+                if self.skip_to is not None and (self.skip_to - num) * direction > 0:
+                    # 解码期间界面要求跳帧，这一帧已经过时
+                    self.release(frame)
+                    continue
+            if not cached:
+                frame = self.scale(frame, source)
+            self.busy += time.perf_counter() - busy
+            if self.filters is None:
+                self.output([((num, source, cached, None), frame)])
+            else:
+                # 循环缓存中的帧已经处理过；在途的帧达到线程数时等最早的一帧，输出顺序与解码顺序一致
+                self.filters.submit((num, source, cached, self.loop_key()), frame, source, bypass=cached)
+                self.output(self.filters.ready(block=self.filters.full()))
+
+    def output(self, results):
+        for i, ((num, source, cached, key), frame) in enumerate(results):
+            if not cached:
+                self.record_loop(source, frame, key)
+            if not self.queue.put(num, frame):
+                # 被跳转或停止打断，剩下的帧也不再需要
+                for _, rest in results[i:]:
+                    self.release(rest)
+                return False
+        return True
+
+    def read(self, num, keep=False):
+        frame = self.cache.get(num)
+        if frame is not None:
+            self.stats.count('cache_hits')
+            return frame
+        if not self.locate(num, keep):
+            return None
+        # 播放时解码到池中的缓冲区；跳转解码出的帧要进缓存，单独分配
+        buffer = None if keep else self.source_pool.acquire(self.shape)
+        start = self.stats.clock()
+        success, frame = self.video_capture.read(buffer)
+        if not success:
+            if buffer is not None:
+                self.source_pool.release(buffer)
+            self.set_eof()
+            return None
+        if frame.shape != self.shape:
+            self.shape = frame.shape
+        self.position += 1
+        self.stats.count('decoded')
+        self.stats.record('decode', start, num)
+        if keep:
+            self.cache.put(num, frame)
+        return frame
+
+    def read_reverse(self, num):
+        # 倒放：把 num 所在的 GOP 正向解码一次放进缓存，之后的帧直接从内存中倒序取出
+        frame = self.cache.get(num)
+        if frame is not None:
+            self.stats.count('cache_hits')
+            return frame
+        keyframe = self.index.floor(num)
+        # 缓存只用一半，保证解码新一段时不会把正在倒放的那一段挤出去；
+        # GOP 超出预算时只保留靠近 num 的部分，更早的帧下次再从关键帧解码
+        chunk = self.cache.capacity(self.shape[0] * self.shape[1] * self.shape[2]) // 2
+        if keyframe is None:
+            chunk = min(chunk, REVERSE_CHUNK_FRAMES)
+            keyframe = 0
+        start = max(keyframe, num + 1 - max(chunk, 1))
+        if not self.locate(start):
+            return None
+        for n in range(start, num + 1):
+            if self.superseded():
+                return None
+            frame = self.read(n, keep=True)
+            if frame is None:
+                return None
+        return frame
+
+    def locate(self, num, keep=False):
+        if self.position == num:
+            return True
+        keyframe = self.index.floor(num)
+        distance = num - self.position
+        # 目标在同一 GOP 内，或者 grab 过去比跳转更快时直接向后 grab，否则跳到最近的关键帧
+        if distance <= 0 or (keyframe is None or keyframe > self.position) and distance * self.grab_cost >= self.seek_cost:
+            start = time.perf_counter()
+            if keyframe is not None and self.timestamps is not None and self.timestamps.variable:
+                self.seek_time(keyframe, num)
+            else:
+                self.position = num if keyframe is None else keyframe
+                self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, self.position)
+            self.seek_cost += (time.perf_counter() - start - self.seek_cost) * 0.1
+        # 向后解码到目标帧，keep 时把沿途的帧放进缓存
+        while self.position < num:
+            start = time.perf_counter()
+            if not self.video_capture.grab():
+                self.set_eof()
+                return False
+            self.grab_cost += (time.perf_counter() - start - self.grab_cost) * 0.1
+            if keep and self.superseded():
+                # 已有更新的跳转请求，放弃本次解码
+                return False
+            if keep and self.position not in self.cache:
+                success, frame = self.video_capture.retrieve()
+                if success:
+                    self.cache.put(self.position, frame)
+            self.position += 1
+        return True
+
+    def seek_time(self, keyframe, num):
+        # OpenCV 按平均帧率把帧号换算成时间再跳转，可变帧率视频会落到别的帧上；
+        # 这里按关键帧的显示时间跳转，再从读回的时间查出实际位置，越过目标时往前多退一些重试
+        msec = self.timestamps.time_of(keyframe)
+        for attempt in range(3):
+            if msec <= 0:
+                break
+            self.video_capture.set(cv2.CAP_PROP_POS_MSEC, msec)
+            landed = self.video_capture.get(cv2.CAP_PROP_POS_MSEC)
+            if landed <= 0:
+                break
+            # 读回的是下一次 read 之前最后解码的一帧
+            self.position = self.timestamps.frame_at(landed) + 1
+            if self.position <= num:
+                return
+            msec -= landed - msec + 1000 * (attempt + 1)
+        self.position = 0
+        self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def scale(self, frame, num=None):
+        # 播放或调整窗口大小时用快速插值，暂停时用高质量插值
+        with QMutexLocker(self.mutex):
+            size, smooth, degrade = self.output_size, self.smooth, self.degrade
+        if not smooth and degrade >= 2:
+            # 降级时按一半分辨率输出，由 Player 绘制时放大
+            width, height = size or (frame.shape[1], frame.shape[0])
+            size = (max(1, width // 2), max(1, height // 2))
+        if size is None or (frame.shape[1], frame.shape[0]) == size:
+            return frame
+        if not smooth and degrade >= 1:
+            interpolation = cv2.INTER_NEAREST
+        elif not smooth:
+            interpolation = cv2.INTER_LINEAR
+        elif size[0] < frame.shape[1]:
+            interpolation = cv2.INTER_AREA
+        else:
+            interpolation = cv2.INTER_CUBIC
+        start = self.stats.clock()
+        output = self.pool.acquire((size[1], size[0]) + frame.shape[2:])
+        output = cv2.resize(frame, size, dst=output, interpolation=interpolation)
+        self.stats.record('scale', start, num)
+        self.source_pool.release(frame)
+        return output
+
+    def fold(self, num):
+        # 把循环中一直增加的帧号换算回视频中的帧号；只在正向播放时循环
+        loop = self.loop
+        if loop is None or self.direction < 0 or num <= loop[1]:
+            return num
+        return loop[0] + (num - loop[0]) % (loop[1] - loop[0] + 1)
+
+    def set_loop(self, a=None, b=None):
+        with QMutexLocker(self.mutex):
+            self.loop = None if a is None else (a, b)
+        self.loop_cache.reset()
+
+    def loop_key(self):
+        # 缓存的帧只有尺寸与生效的滤镜都与当前输出一致时才能直接使用
+        with QMutexLocker(self.mutex):
+            key = self.output_size, not self.smooth and self.degrade >= 2
+        return key + (self.filters.signature() if self.filters is not None else (),)
+
+    def loop_frame(self, num):
+        loop = self.loop
+        if loop is None or self.direction < 0 or not loop[0] <= num <= loop[1]:
+            return None
+        return self.loop_cache.get(num, self.loop_key())
+
+    def record_loop(self, num, frame, key=None):
+        # key 为提交给滤镜时的 loop_key，处理期间设置变了的帧不会混进新的缓存
+        loop = self.loop
+        if loop is not None and self.direction > 0 and loop[0] <= num <= loop[1]:
+            self.loop_cache.put(num, frame, key or self.loop_key())
+
+    def set_filters(self, filters):
+        # 在 start() 之前调用，filters 为 video.filters.Filter 的列表
+        self.filters = FilterPipeline(filters, self.stats, self.release) if filters else None
+
+    def set_output_size(self, width, height):
+        with QMutexLocker(self.mutex):
+            self.output_size = (max(1, int(width)), max(1, int(height)))
+
+    def set_speed(self, speed):
+        with QMutexLocker(self.mutex):
+            self.step = max(1, int(speed))
+            self.keyframes_only = speed >= KEYFRAME_ONLY_SPEED
+
+    def set_direction(self, direction):
+        with QMutexLocker(self.mutex):
+            self.direction = direction
+
+    def set_degrade(self, level):
+        with QMutexLocker(self.mutex):
+            self.degrade = level
+
+    def set_quality(self, smooth):
+        with QMutexLocker(self.mutex):
+            self.smooth = smooth
+
+    def release(self, frame):
+        self.pool.release(frame)
+        self.source_pool.release(frame)
+
+    def superseded(self):
+        with QMutexLocker(self.mutex):
+            return self.seek_target is not None
+
+    def nearest(self, num):
+        # 只返回与目标同一 GOP 内的缓存帧
+        cached = self.cache.nearest(num)
+        if cached is not None:
+            keyframe = self.index.floor(num)
+            if keyframe is not None and self.index.floor(cached[0]) == keyframe:
+                return cached
+        return None
+
+    def set_eof(self):
+        # 先把还在滤镜线程中的帧按顺序放进队列，界面看到 eof 时队列中已经是剩下的全部帧
+        while self.filters is not None and len(self.filters):
+            if not self.output(self.filters.ready(block=True)):
+                self.filters.discard()
+        with QMutexLocker(self.mutex):
+            self.eof = True
+
+    def do_seek(self, target):
+        num, exact, requested = target
+        if self.filters is not None:
+            self.filters.discard()
+        self.queue.clear()
+        self.stats.count('seeks')
+        with QMutexLocker(self.mutex):
+            self.eof = False
+        if not exact and num not in self.cache:
+            # 拖动中只解码最近的关键帧，松手后再精确定位
+            keyframe = self.index.floor(num)
+            if keyframe is not None:
+                num = keyframe
+        self.num = num
+        frame = self.read(num, keep=True)
+        if frame is not None:
+            self.num += self.direction
+            frame = self.scale(frame, num)
+            if self.filters is not None and self.filters.active():
+                frame = self.filters.apply(frame, num)
+            self.signal_frame.emit(num, frame, requested)
+
+    def seek(self, num, exact=True):
+        # 只保留最新的跳转请求，被覆盖的请求直接丢弃
+        with QMutexLocker(self.mutex):
+            self.seek_target = (max(0, int(num)), exact, time.perf_counter())
+            self.skip_to = None
+            self.wake.wakeAll()
+        self.queue.interrupt()
+
+    def skip(self, num):
+        with QMutexLocker(self.mutex):
+            if self.skip_to is None or (num - self.skip_to) * self.direction > 0:
+                self.skip_to = num
+
+    def get(self, until=None):
+        if until is None:
+            item = self.queue.get()
+        else:
+            # 取出不晚于 until 的最后一帧；队列空了就让解码线程直接跳到该帧
+            item = self.queue.pop_until(until, self.direction)
+            if item is None and not len(self.queue):
+                self.skip(until)
+        if item is None and not len(self.queue) and not self.eof:
+            self.stats.count('underruns')
+        return item
+
+    def stop(self):
+        with QMutexLocker(self.mutex):
+            self.stopping = True
+            self.wake.wakeAll()
+        self.queue.interrupt()
+        self.wait()
+        if self.filters is not None:
+            self.filters.shutdown()
+        self.video_capture.release()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+
+# 逐帧滤镜：在解码线程缩放之后、放进队列之前对输出帧做变换。每个滤镜是 func(frame, num)，返回新的数组或原样返回输入，
+# 不能原地修改输入（它可能是跳转缓存中的帧）。命令行用 --filter 指定，按给出的顺序执行：
+#   --filter crop=0.25,0.25,0.5,0.5 --filter denoise --filter overlay='#{num}' --filter mymodule:function
+
+import importlib
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy
+from PyQt5.QtCore import QMutex, QMutexLocker
+
+from settings import FILTER_HEADROOM, FILTER_SETTLE_FRAMES, FILTER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class Filter(object):
+    def __init__(self, name, func, optional=False):
+        self.name = name
+        self.func = func
+        # 可选的滤镜（降噪、锐化）在超出帧时间预算时先被跳过，enabled 由 FilterPipeline 控制；出错的滤镜被关掉
+        self.optional = optional
+        self.enabled = True
+        # 最近耗时的指数平均（秒）
+        self.cost = 0.0
+
+    def __str__(self):
+        return self.name if self.enabled else f'{self.name} (skipped)'
+
+
+def crop(x=0.0, y=0.0, width=1.0, height=1.0):
+    # 按画面比例裁剪，输出帧的尺寸随窗口变化，用比例才能保持裁剪区域不变
+    def apply(frame, num):
+        h, w = frame.shape[:2]
+        top, left = int(y * h), int(x * w)
+        return frame[top:max(top + 1, int((y + height) * h)), left:max(left + 1, int((x + width) * w))].copy()
+    return Filter('crop', apply)
+
+
+def grayscale():
+    def apply(frame, num):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return Filter('grayscale', apply)
+
+
+def denoise(diameter=5, sigma=40):
+    # 双边滤波保留边缘，比非局部均值降噪快得多，适合逐帧实时处理
+    def apply(frame, num):
+        return cv2.bilateralFilter(frame, int(diameter), sigma, sigma)
+    return Filter('denoise', apply, optional=True)
+
+
+def sharpen(amount=0.5, sigma=2):
+    # 反锐化掩模：frame + amount * (frame - blur)
+    def apply(frame, num):
+        blurred = cv2.GaussianBlur(frame, (0, 0), sigma)
+        return cv2.addWeighted(frame, 1 + amount, blurred, -amount, 0)
+    return Filter('sharpen', apply, optional=True)
+
+
+def overlay(text='{num}'):
+    # 在左上角叠加文字，{num} 替换为帧号
+    def apply(frame, num):
+        frame = frame.copy()
+        scale = max(frame.shape[0] / 720, 0.4)
+        origin = (int(10 * scale), int(40 * scale))
+        label = text.format(num=num)
+        cv2.putText(frame, label, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), max(1, int(6 * scale)))
+        cv2.putText(frame, label, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), max(1, int(2 * scale)))
+        return frame
+    return Filter('overlay', apply)
+
+
+FILTERS = {'crop': crop, 'grayscale': grayscale, 'denoise': denoise, 'sharpen': sharpen, 'overlay': overlay}
+
+
+def parse_filter(spec):
+    # name 或 name=a,b,...；overlay 的参数是文字；module:function 为用户函数，签名与内置滤镜相同
+    name, _, args = spec.partition('=')
+    if name == 'overlay':
+        return overlay(args) if args else overlay()
+    if name in FILTERS:
+        try:
+            values = [float(value) for value in args.split(',')] if args else []
+            return FILTERS[name](*values)
+        except (TypeError, ValueError):
+            raise ValueError(f'invalid arguments for filter {name}: {args}')
+    if ':' in name:
+        module, _, function = name.partition(':')
+        try:
+            func = getattr(importlib.import_module(module), function)
+        except (ImportError, AttributeError) as e:
+            raise ValueError(f'cannot load filter {name}: {e}')
+        return Filter(function, func)
+    raise ValueError(f'unknown filter: {name}')
+
+
+class FilterPipeline(object):
+    # 在线程池中并行处理最多 workers 帧，按提交顺序取回结果；OpenCV 在计算时释放 GIL，多个线程可以同时运行。
+    # 整条链每帧的平均耗时除以线程数超过帧间隔（budget）时，关掉最耗时的可选滤镜；预计打开后仍低于
+    # 帧间隔的 FILTER_HEADROOM 倍时再逐个打开。必需的滤镜太慢时由 AdaptiveQuality 降低分辨率，滤镜也随之变快
+    def __init__(self, filters, stats, release, workers=FILTER_WORKERS):
+        self.filters = list(filters)
+        self.stats = stats
+        # 滤镜输出新数组后把输入的缓冲区还给解码线程的缓冲池
+        self.release = release
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='filter')
+        self.pending = deque()
+        self.enabled = True
+        self.budget = None
+        self.cost = 0.0
+        self.settle = 0
+        self.mutex = QMutex()
+
+    def set_budget(self, seconds):
+        with QMutexLocker(self.mutex):
+            self.budget = seconds
+            self.settle = 0
+
+    def active(self):
+        return self.enabled and any(f.enabled for f in self.filters)
+
+    def signature(self):
+        # 当前生效的滤镜，输出帧的内容随之变化
+        return tuple(f.name for f in self.filters if f.enabled) if self.enabled else ()
+
+    def apply(self, frame, num):
+        # 在当前线程中依次执行启用的滤镜
+        start = time.perf_counter()
+        for f in self.filters:
+            if not f.enabled:
+                continue
+            begin = time.perf_counter()
+            try:
+                output = f.func(frame, num)
+            except Exception:
+                # 出错的滤镜不再执行，播放继续
+                logger.exception('filter %s failed, disabled', f.name)
+                f.enabled = f.optional = False
+                continue
+            elapsed = time.perf_counter() - begin
+            f.cost += (elapsed - f.cost) * 0.1
+            if self.stats.enabled:
+                self.stats.sample(f'filter:{f.name}', elapsed, num)
+            if output is not frame and not numpy.may_share_memory(output, frame):
+                self.release(frame)
+            frame = output
+        elapsed = time.perf_counter() - start
+        if self.stats.enabled:
+            self.stats.sample('filter', elapsed, num)
+        self.adapt(elapsed)
+        return frame
+
+    def adapt(self, elapsed):
+        with QMutexLocker(self.mutex):
+            self.cost += (elapsed - self.cost) * 0.1
+            self.settle += 1
+            # 每次调整后等平均耗时稳定下来再看
+            if not self.budget or self.settle < FILTER_SETTLE_FRAMES:
+                return
+            load = self.cost / self.workers
+            running = [f for f in self.filters if f.optional and f.enabled]
+            skipped = [f for f in self.filters if f.optional and not f.enabled]
+            if load > self.budget and running:
+                f = max(running, key=lambda f: f.cost)
+                f.enabled = False
+                logger.info('filter %s skipped: %.1f ms per frame, budget %.1f ms', f.name, load * 1000,
+                            self.budget * 1000)
+            elif skipped and load + min(f.cost for f in skipped) / self.workers < self.budget * FILTER_HEADROOM:
+                f = min(skipped, key=lambda f: f.cost)
+                f.enabled = True
+                logger.info('filter %s resumed', f.name)
+            else:
+                return
+            self.settle = 0
+
+    def submit(self, item, frame, num, bypass=False):
+        # item 随结果原样返回；bypass 的帧不经过滤镜，但仍按顺序排在前面提交的帧之后
+        if bypass or not self.active():
+            future = Future()
+            future.set_result(frame)
+        else:
+            future = self.executor.submit(self.apply, frame, num)
+        self.pending.append((item, future))
+
+    def ready(self, block=False):
+        # 按提交顺序取出已经处理完的帧；block 时至少等到最早的一帧
+        results = []
+        while self.pending and (block or self.pending[0][1].done()):
+            item, future = self.pending.popleft()
+            results.append((item, future.result()))
+            block = False
+        return results
+
+    def full(self):
+        return len(self.pending) >= self.workers
+
+    def discard(self):
+        # 跳转或停止时丢掉还没取走的帧，等正在处理的帧完成后归还缓冲区
+        while self.pending:
+            _, future = self.pending.popleft()
+            self.release(future.result())
+
+    def shutdown(self):
+        self.discard()
+        self.executor.shutdown()
+
+    def __len__(self):
+        return len(self.pending)
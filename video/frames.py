@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+from collections import OrderedDict, deque
+
+import cv2
+import numpy
+from PyQt5 import sip
+from PyQt5.QtCore import QMutex, QMutexLocker, QWaitCondition
+from PyQt5.QtGui import QImage
+
+from settings import (DECODE_QUEUE_DEPTH, DECODE_QUEUE_MEMORY, FRAME_CACHE_MEMORY, FRAME_POOL_SIZE, LOOP_CACHE_COMPRESS,
+                      LOOP_CACHE_MEMORY, LOOP_CACHE_QUALITY)
+
+
+def to_qimage(frame):
+    # 直接包装 numpy 缓冲区，不做颜色转换和拷贝；调用方需要在 QImage 使用期间持有 frame
+    # 行之间可以有间隔（例如裁剪得到的视图），由 bytesPerLine 表示
+    height, width = frame.shape[:2]
+    image_format = QImage.Format_BGR888 if frame.ndim == 3 else QImage.Format_Grayscale8
+    return QImage(sip.voidptr(frame.ctypes.data), width, height, frame.strides[0], image_format)
+
+
+class FramePool(object):
+    def __init__(self, size=FRAME_POOL_SIZE):
+        self.size = size
+        self.shape = None
+        self.free = []
+        self.owned = {}
+        self.mutex = QMutex()
+
+    def acquire(self, shape):
+        with QMutexLocker(self.mutex):
+            if shape != self.shape:
+                self.shape = shape
+                self.free = []
+                self.owned = {}
+            if self.free:
+                return self.free.pop()
+            frame = numpy.empty(shape, numpy.uint8)
+            # 超出池大小的缓冲区不回收，交给 GC
+            if len(self.owned) < self.size:
+                self.owned[id(frame)] = frame
+            return frame
+
+    def release(self, frame):
+        with QMutexLocker(self.mutex):
+            if self.owned.get(id(frame)) is frame and all(f is not frame for f in self.free):
+                self.free.append(frame)
+
+
+class FrameQueue(object):
+    def __init__(self, depth=DECODE_QUEUE_DEPTH, memory=DECODE_QUEUE_MEMORY, recycle=None):
+        self.depth = max(1, depth)
+        self.memory = memory
+        self.recycle = recycle or (lambda frame: None)
+        self.frames = deque()
+        self.interrupted = False
+        self.mutex = QMutex()
+        self.not_full = QWaitCondition()
+
+    def capacity(self, frame):
+        # 深度与内存上限取较小者，至少保留一帧
+        return max(1, min(self.depth, self.memory // max(frame.nbytes, 1)))
+
+    def put(self, num, frame):
+        with QMutexLocker(self.mutex):
+            while len(self.frames) >= self.capacity(frame) and not self.interrupted:
+                self.not_full.wait(self.mutex)
+            if self.interrupted:
+                self.interrupted = False
+                return False
+            self.frames.append((num, frame))
+            return True
+
+    def get(self):
+        with QMutexLocker(self.mutex):
+            if not self.frames:
+                return None
+            item = self.frames.popleft()
+            self.not_full.wakeAll()
+            return item
+
+    def pop_until(self, num, direction=1):
+        # 取出按播放方向不超过 num 的最后一帧，更早的帧回收；没有到期的帧时返回 None
+        with QMutexLocker(self.mutex):
+            item = None
+            while self.frames and (self.frames[0][0] - num) * direction <= 0:
+                if item is not None:
+                    self.recycle(item[1])
+                item = self.frames.popleft()
+            if item is not None:
+                self.not_full.wakeAll()
+            return item
+
+    def clear(self):
+        with QMutexLocker(self.mutex):
+            while self.frames:
+                self.recycle(self.frames.popleft()[1])
+            self.interrupted = False
+            self.not_full.wakeAll()
+
+    def interrupt(self):
+        with QMutexLocker(self.mutex):
+            self.interrupted = True
+            self.not_full.wakeAll()
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.frames)
+
+
+class FrameCache(object):
+    def __init__(self, memory=FRAME_CACHE_MEMORY):
+        self.memory = memory
+        self.size = 0
+        self.frames = OrderedDict()
+        self.mutex = QMutex()
+
+    def get(self, num):
+        with QMutexLocker(self.mutex):
+            frame = self.frames.get(num)
+            if frame is not None:
+                self.frames.move_to_end(num)
+            return frame
+
+    def put(self, num, frame):
+        with QMutexLocker(self.mutex):
+            if num in self.frames:
+                self.size -= self.frames.pop(num).nbytes
+            self.frames[num] = frame
+            self.size += frame.nbytes
+            # 按最近最少使用淘汰
+            while self.size > self.memory and len(self.frames) > 1:
+                self.size -= self.frames.popitem(last=False)[1].nbytes
+
+    def capacity(self, nbytes):
+        # 预算内最多能缓存多少帧
+        return max(1, self.memory // max(nbytes, 1))
+
+    def nearest(self, num):
+        with QMutexLocker(self.mutex):
+            if not self.frames:
+                return None
+            key = min(self.frames, key=lambda n: abs(n - num))
+            return key, self.frames[key]
+
+    def clear(self):
+        with QMutexLocker(self.mutex):
+            self.frames.clear()
+            self.size = 0
+
+    def __contains__(self, num):
+        with QMutexLocker(self.mutex):
+            return num in self.frames
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.frames)
+
+
+class LoopCache(object):
+    # A/B 循环区间内缩放后的输出帧，key 为输出尺寸，尺寸变化后重新缓存；
+    # 超出内存上限时清空并标记 overflow，之后这个区间逐遍解码
+    def __init__(self, memory=LOOP_CACHE_MEMORY, compress=LOOP_CACHE_COMPRESS):
+        self.memory = memory
+        self.compress = compress
+        self.key = None
+        self.frames = {}
+        self.size = 0
+        self.overflow = False
+        self.mutex = QMutex()
+
+    def reset(self, key=None):
+        with QMutexLocker(self.mutex):
+            self.key = key
+            self.frames = {}
+            self.size = 0
+            self.overflow = False
+
+    def get(self, num, key):
+        with QMutexLocker(self.mutex):
+            data = self.frames.get(num) if key == self.key else None
+        if data is None or not self.compress:
+            return data
+        return cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_COLOR)
+
+    def put(self, num, frame, key):
+        if key != self.key:
+            self.reset(key)
+        with QMutexLocker(self.mutex):
+            if self.overflow or num in self.frames:
+                return
+        if self.compress:
+            success, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, LOOP_CACHE_QUALITY])
+            if not success:
+                return
+            data = data.tobytes()
+        else:
+            # 解码缓冲区会被复用，需要拷贝一份
+            data = frame.copy()
+        with QMutexLocker(self.mutex):
+            self.frames[num] = data
+            self.size += len(data) if self.compress else data.nbytes
+            if self.size > self.memory:
+                self.frames = {}
+                self.size = 0
+                self.overflow = True
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.frames)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import bisect
+import heapq
+import os
+import threading
+
+import cv2
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, pyqtSignal
+
+from video.cache import VideoCache
+
+
+# 有 B 帧时压缩包按解码顺序排列，与显示顺序最多相差的包数
+REORDER_PACKETS = 32
+
+
+def lower_priority():
+    # Linux 上 QThread 的优先级不起作用，直接调低调用线程的 nice 值，后台扫描时让出 CPU 给播放
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def open_packets(video_url):
+    # 只读取压缩包、不解码（CAP_PROP_FORMAT 为 -1），关键帧标记与时间戳照常可用；后端不支持时退回正常解码
+    video_capture = cv2.VideoCapture(video_url, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not video_capture.isOpened():
+        video_capture = cv2.VideoCapture(video_url)
+    return video_capture
+
+
+def iter_keyframes(video_capture):
+    # 逐个 grab，通过 CAP_PROP_LRF_HAS_KEY_FRAME 判断是否为关键帧，产出 (帧号, 是否关键帧, 显示时间毫秒)。
+    # 压缩包按解码顺序到达，先按显示时间排序再编号，帧号与解码后的顺序一致
+    pending = []
+    packet = num = 0
+    while video_capture.grab():
+        key = video_capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)
+        if key < 0:
+            # 后端不支持该属性
+            return
+        heapq.heappush(pending, (video_capture.get(cv2.CAP_PROP_POS_MSEC), packet, key > 0))
+        packet += 1
+        if len(pending) > REORDER_PACKETS:
+            msec, _, key = heapq.heappop(pending)
+            yield num, key, msec
+            num += 1
+    while pending:
+        msec, _, key = heapq.heappop(pending)
+        yield num, key, msec
+        num += 1
+
+
+class KeyframeIndex(object):
+    def __init__(self):
+        self.keyframes = []
+        self.scanned = 0
+        self.complete = False
+        self.mutex = QMutex()
+
+    def add(self, num, key):
+        with QMutexLocker(self.mutex):
+            if key:
+                self.keyframes.append(num)
+            self.scanned = num + 1
+
+    def restore(self, keyframes, scanned):
+        # 从磁盘缓存恢复完整的索引
+        with QMutexLocker(self.mutex):
+            self.keyframes = list(keyframes)
+            self.scanned = scanned
+            self.complete = bool(self.keyframes)
+
+    def finish(self):
+        with QMutexLocker(self.mutex):
+            self.complete = bool(self.keyframes)
+
+    def floor(self, num):
+        # 返回不晚于 num 的最近关键帧；num 尚未被扫描到时返回 None
+        with QMutexLocker(self.mutex):
+            if not self.complete and num >= self.scanned:
+                return None
+            i = bisect.bisect_right(self.keyframes, num)
+            return self.keyframes[i - 1] if i else None
+
+    def ceil(self, num):
+        # 返回不早于 num 的最近关键帧；还没扫描到时返回 None
+        with QMutexLocker(self.mutex):
+            i = bisect.bisect_left(self.keyframes, num)
+            return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.keyframes)
+
+
+def load_index(video_url):
+    # 播放器缓存过关键帧索引时直接使用，否则 locate 退回到 CAP_PROP_POS_FRAMES
+    index = KeyframeIndex()
+    cache = VideoCache(video_url)
+    keyframes = cache.get('keyframes')
+    if keyframes:
+        index.restore(keyframes, cache.get('scanned', 0))
+    return index
+
+
+class KeyframeIndexer(QThread):
+    signal_finished = pyqtSignal(int)
+
+    def __init__(self, video_url, index, timestamps=None):
+        super(KeyframeIndexer, self).__init__()
+        self.video_url = video_url
+        self.index = index
+        # 同一遍扫描顺便记录每一帧的显示时间
+        self.timestamps = timestamps
+        self.stopping = False
+
+    def run(self):
+        lower_priority()
+        video_capture = open_packets(self.video_url)
+        try:
+            for num, key, msec in iter_keyframes(video_capture):
+                if self.stopping:
+                    return
+                self.index.add(num, key)
+                if self.timestamps is not None:
+                    self.timestamps.add(num, msec)
+            self.index.finish()
+            if self.timestamps is not None:
+                self.timestamps.finish()
+        finally:
+            video_capture.release()
+        self.signal_finished.emit(len(self.index))
+
+    def stop(self):
+        self.stopping = True
+        self.wait()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import os
+import stat
+import time
+
+import cv2
+from PyQt5.QtCore import QMutexLocker
+
+from settings import DEFAULT_FPS, LIVE_TIMEOUT_MS
+from video.decoder import VideoDecoder
+
+# 尽量少探测、不缓冲，避免打开直播源时先积累几秒延迟
+LOW_LATENCY_OPTIONS = 'probesize;32768|analyzeduration;0|fflags;nobuffer'
+
+
+def is_live_source(source):
+    source = str(source)
+    if source.isdigit() or '://' in source or source.startswith('/dev/video'):
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(source).st_mode)
+    except OSError:
+        return False
+
+
+def open_live_capture(source):
+    source = str(source)
+    if source.isdigit():
+        return cv2.VideoCapture(int(source))
+    previous = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+    os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = LOW_LATENCY_OPTIONS
+    try:
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, LIVE_TIMEOUT_MS,
+                                                         cv2.CAP_PROP_READ_TIMEOUT_MSEC, LIVE_TIMEOUT_MS])
+    finally:
+        if previous is None:
+            del os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS']
+        else:
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = previous
+
+
+class LiveDecoder(VideoDecoder):
+    def __init__(self, video_capture, stats=None, pace=False):
+        super(LiveDecoder, self).__init__(video_capture, stats)
+        # 普通文件当作直播源测试时按原始帧率读取
+        self.pace = pace
+        self.latest = None
+        self.captured = 0.0
+
+    def run(self):
+        fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+        interval = 1 / (fps if fps > 0 else DEFAULT_FPS)
+        start = time.monotonic()
+        while not self.stopping:
+            buffer = self.source_pool.acquire(self.shape)
+            decode_start = self.stats.clock()
+            success, frame = self.video_capture.read(buffer)
+            captured = time.perf_counter()
+            if not success:
+                self.source_pool.release(buffer)
+                self.set_eof()
+                break
+            if frame.shape != self.shape:
+                self.shape = frame.shape
+            self.stats.count('decoded')
+            self.stats.record('decode', decode_start, self.num)
+            frame = self.scale(frame, self.num)
+            if self.filters is not None and self.filters.active():
+                # 直播只保留最新一帧，滤镜直接在读取线程中执行
+                frame = self.filters.apply(frame, self.num)
+            # 只保留最新一帧，界面来不及取的旧帧直接覆盖
+            with QMutexLocker(self.mutex):
+                previous, self.latest = self.latest, (self.num, frame, captured)
+                self.num += 1
+            if previous is not None:
+                self.release(previous[1])
+                self.stats.count('dropped')
+            if self.pace:
+                delay = start + self.num * interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def get(self, until=None):
+        with QMutexLocker(self.mutex):
+            latest, self.latest = self.latest, None
+        if latest is None:
+            if not self.eof:
+                self.stats.count('underruns')
+            return None
+        num, frame, self.captured = latest
+        return num, frame
+
+    def seek(self, num, exact=True):
+        pass
+
+    def set_speed(self, speed):
+        pass
+
+    def set_direction(self, direction):
+        pass
+
+    def fold(self, num):
+        return num
+
+    def nearest(self, num):
+        return None
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import os
+
+import cv2
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, QWaitCondition, pyqtSignal
+
+from settings import DEFAULT_FPS, PROXY_HEIGHT
+from video.index import lower_priority
+
+
+class ProxyBuilder(QThread):
+    # 把原视频转为低分辨率、全部为关键帧的 MJPG 代理文件，帧号与原视频一一对应
+    signal_progress = pyqtSignal(int)
+    signal_finished = pyqtSignal(str)
+
+    def __init__(self, video_url, path, total, height=PROXY_HEIGHT):
+        super(ProxyBuilder, self).__init__()
+        self.video_url = video_url
+        self.path = path
+        self.total = total
+        self.height = height
+        self.stopping = False
+
+    def run(self):
+        # 整个文件解码、缩放再编码，不能和播放争抢 CPU
+        lower_priority()
+        video_capture = cv2.VideoCapture(self.video_url)
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        source_width = video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+        source_height = video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        if not (source_width and source_height):
+            video_capture.release()
+            return
+        # 不放大，宽高取偶数
+        height = max(2, min(self.height, int(source_height)) // 2 * 2)
+        size = (max(2, int(source_width * height / source_height) // 2 * 2), height)
+        # 先写到临时文件，完整写完后再改名，中断后不会留下半个代理文件
+        partial = self.path + '.partial.avi'
+        writer = cv2.VideoWriter(partial, cv2.VideoWriter_fourcc(*'MJPG'), fps if fps > 0 else DEFAULT_FPS, size)
+        num, progress = 0, -1
+        try:
+            while writer.isOpened() and not self.stopping:
+                success, frame = video_capture.read()
+                if not success:
+                    break
+                writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+                num += 1
+                percent = min(99, num * 100 // max(self.total, 1))
+                if percent != progress:
+                    progress = percent
+                    self.signal_progress.emit(percent)
+        finally:
+            writer.release()
+            video_capture.release()
+        if self.stopping or not num:
+            if os.path.exists(partial):
+                os.remove(partial)
+            return
+        os.replace(partial, self.path)
+        self.signal_progress.emit(100)
+        self.signal_finished.emit(self.path)
+
+    def stop(self):
+        self.stopping = True
+        self.wait()
+
+
+class ProxyReader(QThread):
+    # 拖动进度条时从代理文件取帧，只处理最新的请求
+    signal_frame = pyqtSignal(int, object, float)
+
+    def __init__(self, path):
+        super(ProxyReader, self).__init__()
+        self.path = path
+        self.target = None
+        self.stopping = False
+        self.mutex = QMutex()
+        self.wake = QWaitCondition()
+
+    def run(self):
+        video_capture = cv2.VideoCapture(self.path)
+        position = 0
+        while True:
+            with QMutexLocker(self.mutex):
+                while self.target is None and not self.stopping:
+                    self.wake.wait(self.mutex)
+                if self.stopping:
+                    break
+                (num, requested), self.target = self.target, None
+            if num != position:
+                # 每一帧都是关键帧，跳转不需要向后解码
+                video_capture.set(cv2.CAP_PROP_POS_FRAMES, num)
+            success, frame = video_capture.read()
+            position = num + 1 if success else -1
+            if success:
+                self.signal_frame.emit(num, frame, requested)
+        video_capture.release()
+
+    def seek(self, num, requested):
+        with QMutexLocker(self.mutex):
+            self.target = (num, requested)
+            self.wake.wakeAll()
+
+    def stop(self):
+        with QMutexLocker(self.mutex):
+            self.stopping = True
+            self.wake.wakeAll()
+        self.wait()
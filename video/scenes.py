@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import bisect
+from collections import deque
+
+import cv2
+import numpy
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, pyqtSignal
+
+from settings import (SCENE_BATCH, SCENE_MIN_FRAMES, SCENE_RATIO, SCENE_REPORT_FRAMES, SCENE_SIZE, SCENE_THRESHOLD,
+                      SCENE_WINDOW)
+from video.index import lower_priority
+
+
+class SceneIndex(object):
+    # 镜头切换点（每个镜头第一帧的帧号），按帧号递增；scanned 为已经检测过的帧数
+    def __init__(self):
+        self.cuts = []
+        self.scanned = 0
+        self.complete = False
+        self.mutex = QMutex()
+
+    def add(self, num):
+        with QMutexLocker(self.mutex):
+            if not self.cuts or num > self.cuts[-1]:
+                self.cuts.append(num)
+
+    def advance(self, scanned):
+        with QMutexLocker(self.mutex):
+            self.scanned = max(self.scanned, scanned)
+
+    def restore(self, cuts, scanned, complete):
+        # 从磁盘缓存恢复，没扫描完的部分由 SceneDetector 从 scanned 继续
+        with QMutexLocker(self.mutex):
+            self.cuts = list(cuts)
+            self.scanned = scanned
+            self.complete = complete
+
+    def finish(self):
+        with QMutexLocker(self.mutex):
+            self.complete = True
+
+    def next(self, num):
+        # 返回晚于 num 的第一个切换点，没有时返回 None
+        with QMutexLocker(self.mutex):
+            i = bisect.bisect_right(self.cuts, num)
+            return self.cuts[i] if i < len(self.cuts) else None
+
+    def previous(self, num):
+        # 返回早于 num 的最后一个切换点，没有时返回 None
+        with QMutexLocker(self.mutex):
+            i = bisect.bisect_left(self.cuts, num)
+            return self.cuts[i - 1] if i else None
+
+    def snapshot(self):
+        with QMutexLocker(self.mutex):
+            return list(self.cuts), self.scanned, self.complete
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.cuts)
+
+
+class SceneDetector(QThread):
+    # 使用独立的 VideoCapture 逐帧缩成 SCENE_SIZE 的灰度小图，每 SCENE_BATCH 帧一起用 numpy 计算相邻帧的平均绝对差。
+    # 差值超过 SCENE_THRESHOLD，并且是最近 SCENE_WINDOW 帧平均差的 SCENE_RATIO 倍以上时记为切换点，
+    # 镜头内持续的运动不会被误判。有新切换点或每扫描 SCENE_REPORT_FRAMES 帧发出一次 signal_progress
+    signal_progress = pyqtSignal(int)
+    signal_finished = pyqtSignal(int)
+
+    def __init__(self, video_url, scenes):
+        super(SceneDetector, self).__init__()
+        self.video_url = video_url
+        self.scenes = scenes
+        self.recent = deque(maxlen=SCENE_WINDOW)
+        self.stopping = False
+
+    def run(self):
+        lower_priority()
+        video_capture = cv2.VideoCapture(self.video_url)
+        try:
+            num = self.scenes.scanned
+            previous = None
+            if num:
+                # 从上次中断处继续，先读出前一帧作为比较对象
+                video_capture.set(cv2.CAP_PROP_POS_FRAMES, num - 1)
+                previous = self.read(video_capture)
+            batch = []
+            reported = num
+            while not self.stopping:
+                frame = self.read(video_capture)
+                if frame is not None:
+                    batch.append(frame)
+                if batch and (frame is None or len(batch) == SCENE_BATCH):
+                    found = self.detect(num, previous, batch)
+                    previous = batch[-1]
+                    num += len(batch)
+                    batch = []
+                    self.scenes.advance(num)
+                    if found or num - reported >= SCENE_REPORT_FRAMES:
+                        reported = num
+                        self.signal_progress.emit(num)
+                if frame is None:
+                    self.scenes.finish()
+                    break
+        finally:
+            video_capture.release()
+        if not self.stopping:
+            self.signal_finished.emit(len(self.scenes))
+
+    @staticmethod
+    def read(video_capture):
+        if not video_capture.grab():
+            return None
+        success, frame = video_capture.retrieve()
+        if not success:
+            return None
+        small = cv2.resize(frame, SCENE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def detect(self, start, previous, batch):
+        # 返回这一批中找到的切换点个数；视频的第一帧没有前一帧可比
+        frames = numpy.stack(batch if previous is None else [previous] + batch).astype(numpy.int16)
+        diffs = numpy.abs(numpy.diff(frames, axis=0)).mean(axis=(1, 2)) / 255
+        first = start if previous is not None else start + 1
+        found = 0
+        for num, diff in zip(range(first, start + len(batch)), diffs.tolist()):
+            average = sum(self.recent) / len(self.recent) if self.recent else 0
+            last = self.scenes.previous(num + 1)
+            spaced = last is None or num - last >= SCENE_MIN_FRAMES
+            if spaced and diff > SCENE_THRESHOLD and diff > average * SCENE_RATIO:
+                self.scenes.add(num)
+                found += 1
+            else:
+                # 切换点的差值不计入平均，切换后的镜头不受影响
+                self.recent.append(diff)
+        return found
+
+    def stop(self):
+        self.stopping = True
+        self.wait()
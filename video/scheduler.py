@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from PyQt5.QtCore import QMutex, QMutexLocker, QObject, pyqtSignal
+
+from settings import DEFAULT_FPS
+from video.decoder import VideoDecoder
+from video.index import load_index
+from video.stats import PlaybackStats
+
+
+class WallStream(QObject):
+    # 多路同步播放中的一路：不单独开线程，由 DecodeScheduler 的线程池解码
+    signal_ready = pyqtSignal()
+
+    def __init__(self, video_url, executor, stats=None):
+        super(WallStream, self).__init__()
+        self.video_url = video_url
+        self.executor = executor
+        self.stats = stats or PlaybackStats()
+        video_capture = cv2.VideoCapture(video_url)
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else DEFAULT_FPS
+        self.total = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.decoder = VideoDecoder(video_capture, self.stats, load_index(video_url))
+        # wanted 为等待解码的帧号，requested 为最近一次请求的帧号，busy 表示线程池中正在为这一路解码
+        self.wanted = None
+        self.requested = None
+        self.busy = False
+        self.ready = None
+        self.stopping = False
+        self.mutex = QMutex()
+
+    @property
+    def duration(self):
+        return self.total / self.fps
+
+    def frame_at(self, seconds):
+        return int(seconds * self.fps + 1e-6)
+
+    def request(self, num):
+        # 只保留最新的请求；上一帧还没解码完时，中间的请求直接丢弃，落后的一路跳帧追上而不是越来越慢
+        if not 0 <= num < self.total:
+            return
+        with QMutexLocker(self.mutex):
+            # 帧率低于主时钟时，相邻两次请求可能是同一帧
+            if self.stopping or num == self.requested:
+                return
+            self.requested = num
+            if self.wanted is not None:
+                self.stats.count('dropped')
+            self.wanted = num
+            if self.busy:
+                return
+            self.busy = True
+        self.executor.submit(self.work)
+
+    def work(self):
+        while True:
+            with QMutexLocker(self.mutex):
+                num, self.wanted = self.wanted, None
+                if num is None or self.stopping:
+                    # 与 request() 在同一把锁内清除 busy，不会漏掉新请求
+                    self.busy = False
+                    return
+            frame = self.decoder.read(num)
+            if frame is None:
+                continue
+            frame = self.decoder.scale(frame, num)
+            with QMutexLocker(self.mutex):
+                previous, self.ready = self.ready, (num, frame)
+            if previous is not None:
+                self.decoder.release(previous[1])
+            self.signal_ready.emit()
+
+    def take(self, until=None):
+        # 取走已解码的帧；until 不为空时只取不晚于该帧号的帧
+        with QMutexLocker(self.mutex):
+            if self.ready is None or (until is not None and self.ready[0] > until):
+                return None
+            item, self.ready = self.ready, None
+            return item
+
+    def stop(self):
+        with QMutexLocker(self.mutex):
+            self.stopping = True
+            self.wanted = None
+
+
+class DecodeScheduler(object):
+    # 多路视频共用一个线程池，所有请求都以主时钟的秒数给出，各路按自己的帧率换算帧号
+    def __init__(self, video_urls, stats=None, workers=None):
+        workers = workers or min(len(video_urls), os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.streams = [WallStream(video_url, self.executor, stats) for video_url in video_urls]
+
+    @property
+    def duration(self):
+        return max((stream.duration for stream in self.streams), default=0)
+
+    def request(self, seconds):
+        for stream in self.streams:
+            stream.request(stream.frame_at(seconds))
+
+    def stop(self):
+        for stream in self.streams:
+            stream.stop()
+        self.executor.shutdown(wait=True)
+        for stream in self.streams:
+            stream.decoder.video_capture.release()
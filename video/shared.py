@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+
+# 共享内存帧环形缓冲区：播放器把显示的每一帧连同帧号与时间写进来，本机的分析进程直接附加读取，不必再打开视频。
+# 写入方从不等待读取方，读得慢的进程只会漏掉被覆盖的帧。本模块只依赖 numpy，分析进程可以单独导入：
+#   reader = FrameReader('video-player')
+#   for sequence, num, msec, frame in reader.frames(copy=False):
+#       ...
+#       if not reader.valid(sequence): ...  # 处理期间这一帧被覆盖了
+
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+from settings import SHARED_FRAME_BYTES, SHARED_SLOTS
+
+MAGIC = b'VPFR'
+VERSION = 2
+# 文件头：标识、版本、槽数、每槽数据字节数、最近写完的序号、发布进程的 pid
+HEADER = struct.Struct('<4sIIQQI')
+HEADER_BYTES = 64
+SEQUENCE_OFFSET = 20
+# 槽头：序号（写入中为 0）、帧号、时间（毫秒）、高、宽、通道数、数据字节数
+SLOT = struct.Struct('<QqdIIIQ')
+SLOT_BYTES = 64
+
+
+class FramePublisher(object):
+    def __init__(self, name, slots=SHARED_SLOTS, slot_bytes=SHARED_FRAME_BYTES):
+        self.name = name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        size = HEADER_BYTES + slots * (SLOT_BYTES + slot_bytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # 只回收发布进程已经退出的同名共享内存；别的播放器正在使用或无法确认时报错，不能让它的读取方断开
+            reclaim(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.sequence = 0
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, slot_bytes, 0, os.getpid())
+
+    def publish(self, num, msec, frame):
+        # 在调用线程中拷贝一次，帧超过槽的大小时不发布并返回 False
+        if frame.nbytes > self.slot_bytes:
+            return False
+        self.sequence += 1
+        offset = HEADER_BYTES + (self.sequence - 1) % self.slots * (SLOT_BYTES + self.slot_bytes)
+        buf = self.shm.buf
+        # 先把槽的序号清零，读取方看到 0 或前后序号不一致时丢弃这一帧
+        struct.pack_into('<Q', buf, offset, 0)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        numpy.ndarray(frame.shape, numpy.uint8, buf, offset + SLOT_BYTES)[...] = frame
+        SLOT.pack_into(buf, offset, self.sequence, num, msec, height, width, channels, frame.nbytes)
+        struct.pack_into('<Q', buf, SEQUENCE_OFFSET, self.sequence)
+        return True
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach(name):
+    # 只附加不负责删除；Python 3.13 以前附加的共享内存也会登记到 resource_tracker，进程退出时被误删，
+    # 附加期间临时跳过登记（与发布方共用 resource_tracker 的子进程也不能事后 unregister）
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在，只是属于别的用户
+        pass
+    return True
+
+
+def reclaim(name):
+    # 删除上次异常退出留下的共享内存
+    stale = attach(name)
+    magic, version, _, _, _, owner = HEADER.unpack_from(stale.buf, 0)
+    stale.close()
+    if magic != MAGIC or version != VERSION:
+        raise FileExistsError(f'shared memory {name} exists but was not created by this player version, '
+                              f'choose another name')
+    if alive(owner):
+        raise FileExistsError(f'shared memory {name} is in use by process {owner}, choose another name')
+    if not hasattr(stale, '_track'):
+        # Python 3.13 以前 unlink() 总会向 resource_tracker 注销，而 attach() 没有登记，
+        # 先补登记，否则 resource_tracker 会打印 KeyError
+        resource_tracker.register(stale._name, 'shared_memory')
+    stale.unlink()
+
+
+class FrameReader(object):
+    def __init__(self, name):
+        self.shm = attach(name)
+        magic, version, self.slots, self.slot_bytes, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f'{name} is not a frame ring buffer')
+        # last 为最近读到的序号，missed 为被覆盖而没读到的帧数
+        self.last = 0
+        self.missed = 0
+
+    def sequence(self):
+        return struct.unpack_from('<Q', self.shm.buf, SEQUENCE_OFFSET)[0]
+
+    def offset(self, sequence):
+        return HEADER_BYTES + (sequence - 1) % self.slots * (SLOT_BYTES + self.slot_bytes)
+
+    def read(self, copy=True):
+        # 返回最新的一帧 (sequence, num, msec, frame)，没有新帧时返回 None；
+        # copy 为 False 时 frame 直接指向共享内存，用完后用 valid() 确认期间没有被覆盖
+        sequence = self.sequence()
+        if sequence <= self.last:
+            return None
+        offset = self.offset(sequence)
+        slot_sequence, num, msec, height, width, channels, nbytes = SLOT.unpack_from(self.shm.buf, offset)
+        if slot_sequence != sequence:
+            return None
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        frame = numpy.ndarray(shape, numpy.uint8, self.shm.buf, offset + SLOT_BYTES)
+        if copy:
+            frame = frame.copy()
+        if not self.valid(sequence):
+            return None
+        if self.last:
+            self.missed += sequence - self.last - 1
+        self.last = sequence
+        return sequence, num, msec, frame
+
+    def valid(self, sequence):
+        return struct.unpack_from('<Q', self.shm.buf, self.offset(sequence))[0] == sequence
+
+    def wait(self, timeout=None, copy=True, interval=0.001):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            item = self.read(copy)
+            if item is not None:
+                return item
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(interval)
+
+    def frames(self, copy=True, timeout=None):
+        # 依次产出新帧，timeout 秒内没有新帧时结束
+        while True:
+            item = self.wait(timeout, copy)
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import csv
+import json
+import time
+from collections import OrderedDict, deque
+
+from PyQt5.QtCore import QMutex, QMutexLocker
+
+
+class PlaybackStats(object):
+    COUNTERS = ('decoded', 'displayed', 'underruns', 'dropped', 'late', 'seeks', 'cache_hits')
+    # 单帧流水线的各个阶段，按先后顺序
+    STAGES = ('decode', 'scale', 'filter', 'convert', 'paint')
+    # 每项耗时只保留最近的采样
+    WINDOW = 1000
+    # 导出时最多保留的逐帧记录
+    ROWS = 10000
+
+    def __init__(self, enabled=False):
+        # 关闭时 clock() 返回 0，各阶段的 record() 直接返回，几乎没有开销
+        self.enabled = enabled
+        self.mutex = QMutex()
+        self.counters = {}
+        self.samples = {}
+        self.rows = OrderedDict()
+        self.shown = deque(maxlen=self.WINDOW)
+        self.current = None
+        self.reset()
+
+    def reset(self):
+        with QMutexLocker(self.mutex):
+            self.counters = dict.fromkeys(self.COUNTERS, 0)
+            self.samples = {}
+            self.rows = OrderedDict()
+            self.shown.clear()
+            self.current = None
+
+    def count(self, name, n=1):
+        with QMutexLocker(self.mutex):
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def record(self, name, start, num=None):
+        if start:
+            self.sample(name, time.perf_counter() - start, self.current if num is None else num)
+
+    def sample(self, name, value, num=None):
+        with QMutexLocker(self.mutex):
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.WINDOW)
+            self.samples[name].append(value)
+            if num is not None and self.enabled:
+                self.row(num)[name] = value
+
+    def row(self, num):
+        row = self.rows.get(num)
+        if row is None:
+            row = self.rows[num] = {'frame': num}
+            while len(self.rows) > self.ROWS:
+                self.rows.popitem(last=False)
+        return row
+
+    def frame_shown(self, num, queue_depth):
+        with QMutexLocker(self.mutex):
+            self.counters['displayed'] += 1
+            self.current = num
+            if self.enabled:
+                now = time.perf_counter()
+                self.shown.append(now)
+                row = self.row(num)
+                row['time'] = now
+                row['queue'] = queue_depth
+
+    def fps(self):
+        # 最近一秒内实际显示的帧率
+        with QMutexLocker(self.mutex):
+            if not self.shown:
+                return 0
+            last = self.shown[-1]
+            recent = [t for t in self.shown if last - t <= 1]
+        if len(recent) < 2:
+            return 0
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+    def percentiles(self, name, ranks=(50, 90, 99)):
+        with QMutexLocker(self.mutex):
+            values = sorted(self.samples.get(name, ()))
+        if not values:
+            return {}
+        return {rank: values[min(len(values) - 1, len(values) * rank // 100)] for rank in ranks}
+
+    def get(self, name):
+        with QMutexLocker(self.mutex):
+            return self.counters.get(name, 0)
+
+    def snapshot(self):
+        with QMutexLocker(self.mutex):
+            return dict(self.counters)
+
+    def export(self, path):
+        with QMutexLocker(self.mutex):
+            rows = list(self.rows.values())
+            names = list(self.samples)
+        if path.endswith('.json'):
+            report = {
+                'counters': self.snapshot(),
+                'percentiles': {name: self.percentiles(name) for name in names},
+                'frames': rows,
+            }
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        else:
+            columns = ['frame', 'time', 'queue'] + [name for name in self.STAGES if name in names]
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, columns, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+
+    def __str__(self):
+        text = [f'{name}={value}' for name, value in self.snapshot().items()]
+        with QMutexLocker(self.mutex):
+            names = list(self.samples)
+        for name in names:
+            p = self.percentiles(name)
+            text.append(f'{name}(p50/p90/p99)=' + '/'.join(f'{value * 1000:.1f}ms' for value in p.values()))
+        return ', '.join(text)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import bisect
+import os
+
+import cv2
+import numpy
+from PyQt5.QtCore import QMutex, QMutexLocker, QThread, pyqtSignal
+
+from settings import THUMBNAIL_CACHE_MEMORY, THUMBNAIL_COUNT, THUMBNAIL_QUALITY, THUMBNAIL_WIDTH
+from video.frames import FrameCache
+from video.index import lower_priority
+
+
+class Thumbnails(object):
+    # 缩略图以 JPEG 保存在内存与磁盘上，解码后的图像放在一个小的 LRU 缓存中
+    def __init__(self, directory=None, memory=THUMBNAIL_CACHE_MEMORY):
+        self.directory = directory
+        self.nums = []
+        self.encoded = {}
+        self.cache = FrameCache(memory)
+        self.mutex = QMutex()
+
+    def load(self):
+        try:
+            names = os.listdir(self.directory)
+        except (OSError, TypeError):
+            return 0
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext != '.jpg' or not stem.isdigit():
+                continue
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                self.insert(int(stem), f.read())
+        return len(self)
+
+    def add(self, num, frame):
+        height, width = frame.shape[:2]
+        size = (THUMBNAIL_WIDTH, max(1, height * THUMBNAIL_WIDTH // width))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        success, data = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if not success:
+            return
+        data = data.tobytes()
+        self.insert(num, data)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f'{num}.jpg'), 'wb') as f:
+                f.write(data)
+
+    def insert(self, num, data):
+        with QMutexLocker(self.mutex):
+            if num not in self.encoded:
+                bisect.insort(self.nums, num)
+            self.encoded[num] = data
+
+    def get(self, num):
+        # 返回不晚于 num 的最近一张缩略图的帧号与图像
+        with QMutexLocker(self.mutex):
+            i = bisect.bisect_right(self.nums, num)
+            if not i:
+                return None
+            key = self.nums[i - 1]
+            data = self.encoded[key]
+        frame = self.cache.get(key)
+        if frame is None:
+            frame = cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return None
+            self.cache.put(key, frame)
+        return key, frame
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.nums)
+
+
+class ThumbnailWorker(QThread):
+    # 使用独立的 VideoCapture，只解码关键帧，不影响播放；在关键帧索引建好之后启动，不再自己扫描整个文件
+    signal_finished = pyqtSignal(int)
+
+    def __init__(self, video_url, thumbnails, index, total):
+        super(ThumbnailWorker, self).__init__()
+        self.video_url = video_url
+        self.thumbnails = thumbnails
+        self.index = index
+        self.total = total
+        self.stopping = False
+
+    def run(self):
+        lower_priority()
+        video_capture = cv2.VideoCapture(self.video_url)
+        try:
+            # 最多 THUMBNAIL_COUNT 张，相邻两张至少间隔 spacing 帧
+            spacing = max(1, self.total // THUMBNAIL_COUNT)
+            if self.index.complete:
+                self.from_index(video_capture, spacing)
+            if not len(self.thumbnails) and not self.stopping:
+                # 后端不支持关键帧标记时，退回到均匀取帧
+                self.seek_each(video_capture, range(0, self.total, spacing))
+        finally:
+            video_capture.release()
+        if not self.stopping:
+            self.signal_finished.emit(len(self.thumbnails))
+
+    def from_index(self, video_capture, spacing):
+        keyframes, last = [], -spacing
+        for keyframe in self.index.keyframes:
+            if keyframe - last >= spacing:
+                keyframes.append(keyframe)
+                last = keyframe
+        self.seek_each(video_capture, keyframes)
+
+    def seek_each(self, video_capture, nums):
+        for num in nums:
+            if self.stopping:
+                return
+            video_capture.set(cv2.CAP_PROP_POS_FRAMES, num)
+            success, frame = video_capture.read()
+            if success:
+                self.thumbnails.add(num, frame)
+
+    def stop(self):
+        self.stopping = True
+        self.wait()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import bisect
+import re
+
+from PyQt5.QtCore import QMutex, QMutexLocker
+
+from settings import DEFAULT_FPS
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(max(seconds, 0), 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f'{hours}:{minutes:02d}:{seconds:05.2f}'
+
+
+def parse_time(text):
+    # 接受 h:mm:ss.xx、m:ss.xx 或秒数，无法解析时返回 None
+    if not re.fullmatch(r'\s*(\d+:){0,2}\d+(\.\d*)?\s*', text):
+        return None
+    seconds = 0
+    for part in text.strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class TimestampIndex(object):
+    # 每一帧的显示时间（毫秒，CAP_PROP_POS_MSEC），按帧号递增，用二分查找把时间换算成帧号；
+    # 还没扫描到的部分按标称帧率推算，恒定帧率的视频与直接按帧率换算结果相同
+    def __init__(self, fps=0):
+        self.fps = fps if fps > 0 else DEFAULT_FPS
+        self.times = []
+        self.variable = False
+        self.complete = False
+        self.mutex = QMutex()
+
+    def add(self, num, msec):
+        with QMutexLocker(self.mutex):
+            if num != len(self.times):
+                return
+            self.times.append(msec)
+            # 与按标称帧率推算的时间相差超过半帧即为可变帧率
+            if abs(msec - self.times[0] - num * 1000 / self.fps) > 500 / self.fps:
+                self.variable = True
+
+    def restore(self, times):
+        with QMutexLocker(self.mutex):
+            self.times = list(times)
+            self.variable = any(abs(msec - self.times[0] - num * 1000 / self.fps) > 500 / self.fps
+                                for num, msec in enumerate(self.times))
+            self.complete = bool(self.times)
+
+    def finish(self):
+        with QMutexLocker(self.mutex):
+            self.complete = bool(self.times)
+
+    def time_of(self, num):
+        with QMutexLocker(self.mutex):
+            if 0 <= num < len(self.times):
+                return self.times[num]
+            if not self.times:
+                return num * 1000 / self.fps
+            return self.times[-1] + (num - len(self.times) + 1) * 1000 / self.fps
+
+    def frame_at(self, msec):
+        # 返回 msec 时刻正在显示的帧，即显示时间不晚于 msec 的最后一帧
+        with QMutexLocker(self.mutex):
+            if not self.times or msec > self.times[-1]:
+                last, start = (len(self.times) - 1, self.times[-1]) if self.times else (0, 0)
+                return last + max(int((msec - start) * self.fps / 1000 + 1e-3), 0)
+            # 播放时钟逐帧累加 1000/fps，POS_MSEC 由 pts*time_base 换算，两者常差一个浮点误差，
+            # 不加容差时会落到前一帧，出现重复一帧、下一帧被跳过
+            return max(bisect.bisect_right(self.times, msec + 1e-3) - 1, 0)
+
+    def frame_rate(self):
+        # 可变帧率视频的播放时钟按较短的帧间隔（第 10 百分位）刷新，帧率最高的片段也不会漏帧
+        with QMutexLocker(self.mutex):
+            intervals = sorted(b - a for a, b in zip(self.times, self.times[1:]) if b > a)
+        if not intervals:
+            return self.fps
+        return 1000 / intervals[len(intervals) // 10]
+
+    def __len__(self):
+        with QMutexLocker(self.mutex):
+            return len(self.times)
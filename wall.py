@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# !/usr/bin/env python3
+import math
+
+from PyQt5 import QtCore, QtGui
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QGridLayout, QHBoxLayout, QPushButton, QSpinBox, QVBoxLayout, QWidget
+
+from interface.UI import Player, Slider
+from settings import APP_NAME
+from video.clock import VideoTimer
+from video.frames import to_qimage
+from video.scheduler import DecodeScheduler
+from video.stats import PlaybackStats
+
+
+class WallWindow(QWidget):
+    # 多路视频网格同步播放：一个主时钟，解码交给共用的线程池
+    def __init__(self, video_urls, parent=None):
+        super(WallWindow, self).__init__(parent)
+        self.setWindowTitle(f'{APP_NAME} - {len(video_urls)} videos')
+        self.setWindowIcon(QIcon('icons:logo.png'))
+
+        self.stats = PlaybackStats()
+        self.scheduler = DecodeScheduler(video_urls, self.stats)
+        self.streams = self.scheduler.streams
+        # 以第一路的帧率作为主时钟，各路按时间换算成自己的帧号
+        self.fps = self.streams[0].fps
+        self.total = int(self.scheduler.duration * self.fps)
+        self.playhead = 0
+        self.frames = [None] * len(self.streams)
+
+        self.timer = VideoTimer(self.stats)
+        self.timer.fps = self.fps
+
+        grid = QGridLayout()
+        grid.setContentsMargins(0, 0, 0, 0)
+        grid.setSpacing(2)
+        columns = math.ceil(math.sqrt(len(self.streams)))
+        self.players = []
+        for i, stream in enumerate(self.streams):
+            player = Player(self)
+            player.setMinimumSize(320, 180)
+            grid.addWidget(player, i // columns, i % columns)
+            self.players.append(player)
+            stream.signal_ready.connect(lambda i=i: self.stream_ready(i))
+
+        self.button_play = QPushButton('', self)
+        self.button_play.setIcon(QIcon('icons:play.svg'))
+
+        self.widget_slider = Slider(self)
+        self.widget_slider.setOrientation(QtCore.Qt.Horizontal)
+        self.widget_slider.setMaximum(self.total)
+
+        self.widget_spin = QSpinBox(self)
+        self.widget_spin.setAlignment(QtCore.Qt.AlignRight)
+        self.widget_spin.setMaximum(self.total)
+        self.widget_spin.setSuffix(f'/{self.total}')
+
+        controller_layout = QHBoxLayout()
+        controller_layout.addWidget(self.button_play)
+        controller_layout.addWidget(self.widget_slider, stretch=1)
+        controller_layout.addWidget(self.widget_spin)
+        controller_layout.setContentsMargins(0, 0, 0, 0)
+        controller_layout.setSpacing(0)
+
+        main_layout = QVBoxLayout()
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.addLayout(grid, stretch=1)
+        main_layout.addLayout(controller_layout)
+        self.setLayout(main_layout)
+
+        self.button_play.clicked.connect(self.action_play)
+        self.timer.signal_update_frame.connect(self.video_play)
+        self.widget_slider.signal_valueChanged.connect(self.video_jump)
+        self.widget_slider.signal_scrub.connect(self.video_jump)
+
+        self.scheduler.request(0)
+
+    def video_play(self, skip=0):
+        if not self.timer.playing:
+            # 暂停前已经发出的时钟信号
+            self.timer.frame_shown()
+            return
+        self.playhead += 1 + skip
+        if self.playhead >= self.total:
+            self.playhead = self.total
+            self.action_play()
+        seconds = self.playhead / self.fps
+        # 只显示不晚于主时钟的帧，解码慢的一路保留上一帧，下一次请求直接跳到最新位置
+        for i, stream in enumerate(self.streams):
+            self.show_frame(i, stream.frame_at(seconds))
+        self.scheduler.request((self.playhead + 1) / self.fps)
+        self.widget_slider.setValue(self.playhead)
+        self.widget_spin.setValue(self.playhead)
+        self.timer.frame_shown()
+
+    def video_jump(self, num):
+        # 所有画面都精确定位到同一时间
+        self.playhead = num
+        self.widget_slider.setValue(num)
+        self.widget_spin.setValue(num)
+        self.scheduler.request(num / self.fps)
+
+    def stream_ready(self, i):
+        # 播放时由主时钟统一显示，暂停或跳转时解码完成就显示
+        if not self.timer.playing:
+            self.show_frame(i)
+
+    def show_frame(self, i, until=None):
+        stream = self.streams[i]
+        item = stream.take(until)
+        if item is None:
+            return
+        frame = item[1]
+        previous, self.frames[i] = self.frames[i], frame
+        self.players[i].set_image(to_qimage(frame), frame)
+        self.stats.frame_shown(self.playhead, 0)
+        if previous is not None and previous is not frame:
+            stream.decoder.release(previous)
+
+    def action_play(self):
+        playing = self.timer.playing
+        self.button_play.setIcon(QIcon(['icons:pause.svg', 'icons:play.svg'][playing]))
+        if playing:
+            self.timer.pause()
+        else:
+            if self.playhead >= self.total:
+                self.video_jump(0)
+            self.timer.start()
+
+    def keyPressEvent(self, event: QtGui.QKeyEvent):
+        if event.key() == QtCore.Qt.Key_Space:
+            self.action_play()
+        event.accept()
+
+    def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
+        for stream, player in zip(self.streams, self.players):
+            shape = stream.decoder.shape
+            size = QSize(shape[1], shape[0])
+            size.scale(player.size(), QtCore.Qt.KeepAspectRatio)
+            stream.decoder.set_output_size(size.width(), size.height())
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        self.timer.pause()
+        self.timer.wait()
+        self.scheduler.stop()